@@ -0,0 +1,326 @@
+import argparse
+import asyncio
+import json
+import time
+
+from main import (
+    MAX_RETRIES,
+    agenerate_test_with_context,
+    aevaluate_test_with_llmj,
+    aretrieve_context,
+    CANDIDATES,
+    best_failure,
+    clean_generated_code,
+    make_attempt,
+    MODEL,
+    corpus_key,
+    create_vector_store_from_file,
+    should_judge,
+    should_run_matrix,
+    spec_version,
+    tracer,
+)
+from sandbox import MAX_WORKERS
+from spec_index import DEFAULT_SPEC, available_specs, resolve_spec
+from corpus import Corpus
+from matrix import run_matrix
+
+LLM_CONCURRENCY = 8
+COMPILE_CONCURRENCY = MAX_WORKERS
+TABLE_COLUMNS = ["feature", "status", "attempt", "exit_code", "seconds"]
+# How often the test being generated is copied into the progress row (as "partial"), for the live view.
+PARTIAL_SECONDS = 0.25
+
+
+def load_features(path):
+    """Read a batch from a text file (one feature per line) or a .jl prompt file.
+
+    Entries from a .jl file already carry their spec context inside the instruction,
+    so retrieval is skipped for them (context is set to "").
+    """
+    items = []
+    if path.endswith(".jl") or path.endswith(".jsonl"):
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                items.append({
+                    "feature": f"idx {record.get('idx', len(items))}",
+                    "prompt": record["Instruction"],
+                    "context": "",
+                })
+    else:
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    items.append({"feature": line.strip(), "prompt": line.strip(), "context": None})
+    return items
+
+
+def only_gaps(items, corpus, spec_path="spec.txt"):
+    """Items whose feature has no passing test yet for this spec and model."""
+    missing = set(corpus.features_without_passing_test([item["feature"] for item in items],
+                                                       spec_version(spec_path), MODEL))
+    return [item for item in items if item["feature"] in missing]
+
+
+def parse_features(text):
+    return [{"feature": line.strip(), "prompt": line.strip(), "context": None}
+            for line in text.splitlines() if line.strip()]
+
+
+def precheck_feature(item):
+    """The feature name precheck.py matches the test against. Items from a .jl prompt file
+    (context "") have only the full instruction, whose boilerplate and pasted spec text name
+    every clause under the sun, so they are not matched."""
+    return None if item["context"] == "" else item["feature"]
+
+
+async def in_slot(semaphore, func, *args):
+    """func(*args) in a worker thread, holding a slot of semaphore until the thread returns.
+    A thread can't be cancelled: if the caller is, the build goes on and keeps its slot, so
+    the semaphore bounds the builds actually running."""
+    await semaphore.acquire()
+    work = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    work.add_done_callback(lambda _: semaphore.release())
+    return await asyncio.shield(work)
+
+
+async def generate_and_compile(item, context_texts, previous_code, previous_output, llm_sem, compile_sem,
+                               on_compile=None, on_token=None):
+    async with llm_sem:
+        generated_code = await agenerate_test_with_context(item["prompt"], context_texts, previous_code, previous_output,
+                                                           on_token)
+    generated_code = clean_generated_code(generated_code)
+
+    if on_compile:
+        on_compile()
+    return await in_slot(compile_sem, make_attempt, generated_code, precheck_feature(item))
+
+
+async def run_candidates(item, context_texts, previous_code, previous_output, llm_sem, compile_sem, n):
+    """n concurrent generate+compile tasks; the first to pass wins and the rest are cancelled.
+    If none passes, the most promising failure is returned (see main.best_failure)."""
+    async def candidate(index):
+        with tracer.collect(candidate=index):
+            return await generate_and_compile(item, context_texts, previous_code, previous_output, llm_sem, compile_sem)
+
+    pending = {asyncio.create_task(candidate(index)) for index in range(n)}
+    finished = []
+    errors = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    errors.append(task.exception())
+                else:
+                    finished.append(task.result())
+            if any(attempt["exit_code"] == 0 for attempt in finished):
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    if not finished:
+        raise errors[0]
+    passing = [attempt for attempt in finished if attempt["exit_code"] == 0]
+    attempt = passing[0] if passing else best_failure(finished)
+    attempt["candidates"] = [{"status": other["status"], "exit_code": other["exit_code"]} for other in finished]
+    return attempt
+
+
+async def run_feature(item, vector_store, llm_sem, compile_sem, row, on_update, candidates=CANDIDATES,
+                      corpus=None, force=False, on_attempt=None, on_attempt_update=None):
+    """Retrieve -> generate -> compile -> judge for one feature, with the usual retries.
+
+    With a corpus, every attempt is recorded, and a feature that already has a passing
+    test for the same key is answered from it unless force is set. on_attempt(attempt) is
+    called as each attempt finishes compiling, before its judge and compiler matrix have answered;
+    on_attempt_update(index, attempt) each time one of them has filled in that attempt.
+    While a single candidate is generated, row["partial"] holds the test so far.
+    """
+    start = time.time()
+    partial_sent = 0.0
+
+    def update(**fields):
+        row.update(fields, seconds=round(time.time() - start, 1))
+        on_update()
+
+    def on_token(text):
+        nonlocal partial_sent
+        if time.monotonic() - partial_sent >= PARTIAL_SECONDS:
+            partial_sent = time.monotonic()
+            update(partial=text)
+
+    spec_path = resolve_spec(item.get("spec", DEFAULT_SPEC))[1]
+    key = corpus_key(item["feature"], item["prompt"], spec_path) if corpus is not None else None
+    if key is not None and not force:
+        stored = corpus.passing_test(key)
+        if stored is not None:
+            update(status="stored", attempt=stored["retry"] + 1, exit_code=0)
+            attempt = {name: stored[name] for name in ("code", "status", "exit_code", "compiler_output",
+                                                       "runtime_output", "evaluation", "matrix")}
+            return {"feature": item["feature"], "context": None, "attempts": [attempt], "passed": True,
+                    "stored": True, "timings": []}
+
+    timings = []
+    context_texts = item["context"]
+    if context_texts is None:
+        update(status="retrieving")
+        with tracer.collect(timings, feature=item["feature"]):
+            retrieved_docs = await aretrieve_context(vector_store, item["prompt"])
+        context_texts = "\n".join([doc.page_content for doc in retrieved_docs])
+
+    attempts = []
+    judges = []
+    checks = []
+    previous_code = None
+    previous_output = None
+
+    async def judge(index, attempt):
+        async with llm_sem:
+            attempt["evaluation"] = await aevaluate_test_with_llmj(
+                item["prompt"], context_texts, attempt["code"], attempt["compiler_output"], attempt["runtime_output"])
+        if attempt.get("corpus_id") is not None:
+            corpus.set_evaluation(attempt["corpus_id"], attempt["evaluation"])
+        if on_attempt_update:
+            on_attempt_update(index, attempt)
+
+    async def check_matrix(index, attempt):
+        # One compile slot per matrix; its cells share the sandbox pool's workers.
+        attempt["matrix"] = await in_slot(compile_sem, run_matrix, attempt["code"])
+        if attempt.get("corpus_id") is not None:
+            corpus.set_matrix(attempt["corpus_id"], attempt["matrix"])
+        if on_attempt_update:
+            on_attempt_update(index, attempt)
+
+    try:
+        for retry in range(MAX_RETRIES + 1):
+            # Spans of this attempt, including its background judge and matrix tasks, go to timings.
+            with tracer.collect(timings, feature=item["feature"], retry=retry):
+                update(status="generating" if candidates == 1 else f"sampling {candidates}", attempt=retry + 1,
+                       partial=None)
+                if candidates > 1:
+                    attempt = await run_candidates(item, context_texts, previous_code, previous_output,
+                                                   llm_sem, compile_sem, candidates)
+                else:
+                    attempt = await generate_and_compile(
+                        item, context_texts, previous_code, previous_output, llm_sem, compile_sem,
+                        lambda: update(status="compiling", partial=None), on_token)
+                attempts.append(attempt)
+                if corpus is not None:
+                    attempt["corpus_id"] = corpus.record_attempt(key, retry, attempt)
+                if on_attempt:
+                    on_attempt(attempt)
+                update(exit_code=attempt["exit_code"])
+                # The judge and matrix run alongside the next attempt instead of blocking it.
+                final = attempt["exit_code"] == 0 or retry == MAX_RETRIES
+                if should_judge(attempt, final):
+                    judges.append(asyncio.create_task(judge(retry, attempt)))
+                if should_run_matrix(attempt, final):
+                    checks.append(asyncio.create_task(check_matrix(retry, attempt)))
+                if attempt["exit_code"] == 0:
+                    break
+                previous_code = attempt["code"]
+                previous_output = attempt["feedback"]
+
+        if judges or checks:
+            update(status="judging" if judges else "matrix")
+            await asyncio.gather(*judges, *checks)
+    finally:
+        # Cancelled (or failed) part way: the judge and matrix tasks stop too, before the job is
+        # marked finished, so they don't write to the corpus after it. A matrix build already
+        # running keeps its compile slot until it ends (see in_slot).
+        unfinished = [task for task in judges + checks if not task.done()]
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            await asyncio.gather(*unfinished, return_exceptions=True)
+
+    passed = attempts[-1]["exit_code"] == 0
+    update(status="passed" if passed else "failed")
+    return {"feature": item["feature"], "context": context_texts, "attempts": attempts, "passed": passed,
+            "timings": timings}
+
+
+async def run_batch(items, vector_store, llm_concurrency=LLM_CONCURRENCY, compile_concurrency=COMPILE_CONCURRENCY, on_update=None,
+                    candidates=CANDIDATES, corpus=None, force=False):
+    """Run every item concurrently. LLM calls and compile jobs are throttled separately.
+
+    on_update(rows) is called with the progress table after every state change.
+    """
+    llm_sem = asyncio.Semaphore(llm_concurrency)
+    compile_sem = asyncio.Semaphore(compile_concurrency)
+    rows = [{"feature": item["feature"], "status": "queued", "attempt": 0, "exit_code": None, "seconds": 0.0}
+            for item in items]
+
+    def notify():
+        if on_update:
+            on_update(rows)
+
+    async def guarded(item, row):
+        try:
+            return await run_feature(item, vector_store, llm_sem, compile_sem, row, notify, candidates, corpus, force)
+        except Exception as e:
+            row.update(status=f"error: {e}")
+            notify()
+            return {"feature": item["feature"], "error": str(e), "attempts": [], "passed": False}
+
+    notify()
+    return await asyncio.gather(*(guarded(item, row) for item, row in zip(items, rows)))
+
+
+def print_row(rows, printed):
+    for row in rows:
+        key = (row["feature"], row["status"], row["attempt"])
+        if key not in printed:
+            printed.add(key)
+            print(f"[{row['seconds']:>7.1f}s] {row['feature']}: {row['status']} (attempt {row['attempt']})", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate tests for many OpenACC features concurrently.")
+    parser.add_argument("features", help="Text file with one feature per line, or a .jl prompt file.")
+    parser.add_argument("--spec", default=DEFAULT_SPEC,
+                        help=f"Spec version ({', '.join(available_specs())}) or a spec file.")
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY)
+    parser.add_argument("--compile-concurrency", type=int, default=COMPILE_CONCURRENCY)
+    parser.add_argument("--candidates", type=int, default=CANDIDATES,
+                        help="Tests sampled concurrently per attempt; the first to pass wins.")
+    parser.add_argument("--out", default="batch_results.jsonl")
+    parser.add_argument("--no-corpus", action="store_true", help="Don't read or record the test corpus.")
+    parser.add_argument("--force", action="store_true", help="Regenerate features that already have a passing test.")
+    parser.add_argument("--only-gaps", action="store_true", help="Skip features that already have a passing test.")
+    args = parser.parse_args()
+
+    spec, spec_path = resolve_spec(args.spec)
+    items = load_features(args.features)
+    for item in items:
+        item["spec"] = spec
+    vector_store = create_vector_store_from_file(spec_path)
+    corpus = None if args.no_corpus else Corpus()
+    if corpus is not None and args.only_gaps:
+        items = only_gaps(items, corpus, spec_path)
+        print(f"{len(items)} features without a passing test")
+    printed = set()
+    start = time.time()
+    results = asyncio.run(run_batch(items, vector_store, args.llm_concurrency, args.compile_concurrency,
+                                    on_update=lambda rows: print_row(rows, printed), candidates=args.candidates,
+                                    corpus=corpus, force=args.force))
+
+    with open(args.out, 'w', encoding='utf-8') as file:
+        for result in results:
+            file.write(json.dumps(result) + "\n")
+
+    passed = sum(result["passed"] for result in results)
+    stored = sum(result.get("stored", False) for result in results)
+    print(f"{passed}/{len(results)} features passed ({stored} from the corpus) in {time.time() - start:.1f}s, "
+          f"results in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHAT_MODEL = "mistral-nemo-12b-instruct"
+EMBEDDING_MODEL = "NV-Embed-QA"
+EMBEDDING_DIMENSION = 1024
+
+PASSING_TEST = """c
+#include <stdio.h>
+#include <stdlib.h>
+
+int main() {
+    int n = 1024, errors = 0;
+    float *a = (float *) malloc(n * sizeof(float));
+    #pragma acc parallel loop copyout(a[0:n])
+    for (int i = 0; i < n; ++i) {
+        a[i] = 2.0f * i;
+    }
+    for (int i = 0; i < n; ++i) {
+        if (a[i] != 2.0f * i) {
+            errors++;
+        }
+    }
+    free(a);
+    return errors != 0;
+}
+"""
+# No main(): fails to compile with a real compiler and with stub_compiler.py, which forces a retry.
+FAILING_TEST = """c
+#include <stdio.h>
+
+int test_parallel() {
+    #pragma acc parallel
+    return undeclared_variable;
+}
+"""
+JUDGE_VERDICT = "The test exercises the feature and checks its result, so it is a reasonable test."
+
+
+class MockSettings:
+    """Latency knobs shared by the handlers. first_token_seconds is the delay before the
+    first byte of a response; tokens_per_second paces the rest."""
+
+    def __init__(self, first_token_seconds=0.2, tokens_per_second=200.0, embed_seconds=0.02,
+                 failure_rate=0.3, seed=0, throttle_rate=0.0):
+        self.first_token_seconds = first_token_seconds
+        self.tokens_per_second = tokens_per_second
+        self.embed_seconds = embed_seconds
+        self.failure_rate = failure_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {"chat": 0, "embeddings": 0, "throttled": 0}
+        self.connections = 0
+
+    def count(self, kind):
+        with self.lock:
+            self.requests[kind] += 1
+
+    def throttled(self):
+        with self.lock:
+            throttle = self.random.random() < self.throttle_rate
+            self.requests["throttled"] += throttle
+        return throttle
+
+    def completion(self):
+        with self.lock:
+            failing = self.random.random() < self.failure_rate
+        return f"Here is the test.\n```{FAILING_TEST if failing else PASSING_TEST}```\n\nThe test returns 0 on success."
+
+
+def split_tokens(text):
+    return re.findall(r'\s*\S+', text)
+
+
+def embed(text, dimension=EMBEDDING_DIMENSION):
+    """Hashed bag-of-words vector: deterministic, and texts sharing words come out close."""
+    vector = [0.0] * dimension
+    for word in re.findall(r'\w+', text.lower()):
+        digest = hashlib.md5(word.encode('utf-8')).digest()
+        vector[int.from_bytes(digest[:4], 'little') % dimension] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    settings = None  # set by make_server
+    models = ()
+    protocol_version = "HTTP/1.1"  # keep-alive, like the NIMs
+
+    def setup(self):
+        super().setup()
+        with self.settings.lock:
+            self.settings.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json({"object": "list", "data": [{"id": model, "object": "model", "owned_by": "mock"}
+                                                       for model in self.models]})
+        else:
+            self.send_json({"error": f"unknown path {self.path}"}, 404)
+
+    def do_POST(self):
+        request = self.read_json()
+        if self.settings.throttled():
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self.settings.count("chat")
+            self.chat(request)
+        elif self.path.rstrip("/").endswith("/embeddings"):
+            self.settings.count("embeddings")
+            self.embeddings(request)
+        else:
+            self.send_json({"error": f"unknown path {self.path}"}, 404)
+
+    def chat(self, request):
+        settings = self.settings
+        streaming = request.get("stream", False)
+        # Only generation streams; the judge's one-sentence verdict is a plain invoke().
+        text = settings.completion() if streaming else JUDGE_VERDICT
+        tokens = split_tokens(text)[:request.get("max_tokens") or None]
+        time.sleep(settings.first_token_seconds)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        if not streaming:
+            time.sleep(len(tokens) / settings.tokens_per_second)
+            self.send_json({
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", CHAT_MODEL),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        start = time.monotonic()
+        try:
+            for i, token in enumerate(tokens):
+                # Pace against the clock rather than sleeping per token, so the rate holds at high tokens/s.
+                delay = start + i / settings.tokens_per_second - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.send_event({"id": completion_id, "object": "chat.completion.chunk",
+                                 "model": request.get("model", CHAT_MODEL),
+                                 "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+            self.send_event({"id": completion_id, "object": "chat.completion.chunk",
+                             "model": request.get("model", CHAT_MODEL),
+                             "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client hung up once the code block closed
+        self.close_connection = True
+
+    def send_event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def embeddings(self, request):
+        inputs = request.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        time.sleep(self.settings.embed_seconds)
+        self.send_json({
+            "object": "list", "model": request.get("model", EMBEDDING_MODEL),
+            "data": [{"object": "embedding", "index": i, "embedding": embed(text)} for i, text in enumerate(inputs)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+
+def make_server(port, settings, models, host="127.0.0.1"):
+    handler = type("Handler", (MockHandler,), {"settings": settings, "models": tuple(models)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_servers(settings, chat_port=0, embed_port=0):
+    """Start the chat and embedding stand-ins in background threads (port 0 picks a free port).
+
+    Returns (chat_url, embed_url, stop) with URLs in the form main.py expects.
+    """
+    servers = [make_server(chat_port, settings, [CHAT_MODEL]), make_server(embed_port, settings, [EMBEDDING_MODEL])]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    chat_server, embed_server = servers
+
+    def stop():
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+    return (f"http://127.0.0.1:{chat_server.server_port}/v1/chat/completions",
+            f"http://127.0.0.1:{embed_server.server_port}/v1", stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-ins for the chat and embedding NIMs.")
+    parser.add_argument("--chat-port", type=int, default=8000)
+    parser.add_argument("--embed-port", type=int, default=8081)
+    parser.add_argument("--first-token-seconds", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--embed-seconds", type=float, default=0.02)
+    parser.add_argument("--failure-rate", type=float, default=0.3, help="Share of completions that fail to compile.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with 429.")
+    args = parser.parse_args()
+
+    settings = MockSettings(args.first_token_seconds, args.tokens_per_second, args.embed_seconds, args.failure_rate,
+                            throttle_rate=args.throttle_rate)
+    chat_url, embed_url, stop = start_servers(settings, args.chat_port, args.embed_port)
+    print(f"chat: {chat_url}\nembeddings: {embed_url}\nCtrl-C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop()
+
+
+if __name__ == "__main__":
+    main()
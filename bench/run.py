@@ -0,0 +1,206 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main as app
+from batch import COMPILE_CONCURRENCY, LLM_CONCURRENCY, run_feature
+from sandbox import SandboxPool, set_default_pool
+from compile_cache import CompileCache
+from spec_sections import MAPPING
+from mock_servers import PASSING_TEST, MockSettings, start_servers
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SCENARIOS = ("retrieve", "generate", "compile", "judge", "pipeline")
+STUB_COMPILER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_compiler.py")
+# p95 increase over the baseline that counts as a regression.
+TOLERANCE = 0.2
+
+
+def percentile(values, q):
+    """Nearest-rank percentile; q in [0, 100]."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def queries(count):
+    """Feature names (answered by the section lookup) interleaved with free-form queries
+    (answered by the index), so both retrieval paths are measured."""
+    features = list(MAPPING)
+    result = []
+    for i in range(count):
+        feature = features[i // 2 % len(features)]
+        result.append(feature if i % 2 == 0 else f"how is the {feature} used with data clauses")
+    return result
+
+
+def measure(call, items, concurrency):
+    """Await call(item) for every item, `concurrency` at a time, on one event loop as the job
+    server does. Returns (latencies, extras, wall seconds)."""
+    async def run():
+        slots = asyncio.Semaphore(concurrency)
+
+        async def timed(item):
+            async with slots:
+                start = time.perf_counter()
+                extra = await call(item)
+                return time.perf_counter() - start, extra
+
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(*(timed(item) for item in items))
+        return outcomes, time.perf_counter() - start
+
+    outcomes, wall = asyncio.run(run())
+    return [latency for latency, _ in outcomes], [extra for _, extra in outcomes], wall
+
+
+def pipeline_call(vector_store):
+    """What a job runs for one feature: batch.run_feature, with the job server's LLM and
+    compile limits shared by every feature in flight."""
+    llm_sem = asyncio.Semaphore(LLM_CONCURRENCY)
+    compile_sem = asyncio.Semaphore(COMPILE_CONCURRENCY)
+
+    async def call(feature):
+        item = {"feature": feature, "prompt": feature, "context": None}
+        result = await run_feature(item, vector_store, llm_sem, compile_sem, {}, lambda: None)
+        return {"attempts": len(result["attempts"]), "passed": result["passed"]}
+
+    return call
+
+
+def scenario_call(name, vector_store, context):
+    if name == "retrieve":
+        async def call(query):
+            await app.aretrieve_context(vector_store, query)
+    elif name == "generate":
+        async def call(feature):
+            await app.agenerate_test_with_context(feature, context)
+    elif name == "compile":
+        async def call(feature):
+            # A unique comment per call keeps the compile cache (if enabled) from answering.
+            result = await asyncio.to_thread(app.compile_and_run_sandboxed,
+                                             PASSING_TEST[2:] + f"// {feature} {time.perf_counter_ns()}\n")
+            return {"exit_code": result.exit_code}
+    elif name == "judge":
+        async def call(feature):
+            await app.aevaluate_test_with_llmj(feature, context, PASSING_TEST[2:], "", "")
+    else:
+        call = pipeline_call(vector_store)
+    return call
+
+
+def summarize(name, concurrency, latencies, extras, wall):
+    row = {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "mean": sum(latencies) / len(latencies),
+        "throughput": len(latencies) / wall,
+    }
+    if name == "pipeline":
+        row["attempts"] = sum(extra["attempts"] for extra in extras) / len(extras)
+        row["pass_rate"] = sum(extra["passed"] for extra in extras) / len(extras)
+    return row
+
+
+def compare(rows, baseline_path, tolerance=TOLERANCE):
+    """Rows whose p95 grew more than tolerance over the baseline run."""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {(row["scenario"], row["concurrency"]): row for row in json.load(file)["results"]}
+    regressions = []
+    for row in rows:
+        before = baseline.get((row["scenario"], row["concurrency"]))
+        if before and row["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append((row, before))
+    return regressions
+
+
+def print_table(rows, header=True):
+    if header:
+        print(f"{'scenario':<10} {'conc':>4} {'n':>4} {'p50 s':>8} {'p95 s':>8} {'req/s':>8}  extra")
+    for row in rows:
+        extra = f"attempts {row['attempts']:.2f}, pass {row['pass_rate']:.0%}" if "attempts" in row else ""
+        print(f"{row['scenario']:<10} {row['concurrency']:>4} {row['requests']:>4} {row['p50']:>8.3f} "
+              f"{row['p95']:>8.3f} {row['throughput']:>8.2f}  {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline benchmark against local mock NIMs and a stub compiler.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="Calls per scenario and concurrency level.")
+    parser.add_argument("--spec", default="spec.txt")
+    parser.add_argument("--mode", default=app.RETRIEVAL_MODE, choices=("vector", "hybrid", "lexical"))
+    parser.add_argument("--compiler", default=STUB_COMPILER,
+                        help="Compiler command: the stub (default), gcc, clang or nvc.")
+    parser.add_argument("--flags", nargs="*", default=None, help="Compile flags; default none, or the sandbox's for nvc.")
+    parser.add_argument("--compile-cache", action="store_true", help="Benchmark with the compile cache enabled.")
+    parser.add_argument("--first-token-seconds", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--embed-seconds", type=float, default=0.02)
+    parser.add_argument("--failure-rate", type=float, default=0.3)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests the mock answers with 429.")
+    parser.add_argument("--baseline", help="Earlier results file to check for p95 regressions.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--out", help="Results file; default bench/results/bench-<time>.json.")
+    args = parser.parse_args()
+
+    settings = MockSettings(args.first_token_seconds, args.tokens_per_second, args.embed_seconds, args.failure_rate,
+                            throttle_rate=args.throttle_rate)
+    chat_url, embed_url, stop = start_servers(settings)
+    workdir = tempfile.mkdtemp(prefix="llm4vv-bench-")
+    # Point the app at the stand-ins, and keep the benchmark's index out of the real one.
+    app.CHAT_URL, app.EMBED_URL, app.INDEX_DIR = chat_url, embed_url, os.path.join(workdir, "index")
+    # The stand-in answers every feature with the same test, so it can't match the feature asked for.
+    app.PRECHECK_FEATURE = False
+    flags = args.flags if args.flags is not None else (None if os.path.basename(args.compiler).startswith("nv") else [])
+    cache = CompileCache(os.path.join(workdir, "compile")) if args.compile_cache else None
+    set_default_pool(SandboxPool(max_workers=max(args.concurrency), cache=cache, compiler=args.compiler, flags=flags))
+
+    try:
+        start = time.perf_counter()
+        vector_store = app.create_vector_store_from_file(args.spec, args.mode)
+        print(f"index built in {time.perf_counter() - start:.2f}s ({settings.requests['embeddings']} embedding requests)")
+        context = "\n\n".join(doc.page_content for doc in asyncio.run(app.aretrieve_context(vector_store, "parallel construct")))
+
+        rows = []
+        print_table([])
+        for name in args.scenarios:
+            items = queries(args.requests) if name == "retrieve" else [list(MAPPING)[i % len(MAPPING)]
+                                                                       for i in range(args.requests)]
+            for concurrency in args.concurrency:
+                latencies, extras, wall = measure(scenario_call(name, vector_store, context), items, concurrency)
+                rows.append(summarize(name, concurrency, latencies, extras, wall))
+                print_table(rows[-1:], header=False)
+    finally:
+        stop()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("bench-%Y%m%d-%H%M%S.json"))
+    config = {key: value for key, value in vars(args).items() if key not in ("baseline", "out")}
+    with open(out, 'w', encoding='utf-8') as file:
+        json.dump({"time": time.time(), "config": config, "requests": settings.requests,
+                   "connections": settings.connections, "results": rows}, file, indent=2)
+    print(f"\nResults saved to {out} ({sum(settings.requests.values())} requests over {settings.connections} connections)")
+    print_table(rows)
+
+    if args.baseline:
+        regressions = compare(rows, args.baseline, args.tolerance)
+        for row, before in regressions:
+            print(f"REGRESSION {row['scenario']} x{row['concurrency']}: p95 {before['p95']:.3f}s -> {row['p95']:.3f}s")
+        if regressions:
+            sys.exit(1)
+        print(f"No p95 regressions over {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
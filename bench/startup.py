@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# (name, directory it is imported from). dev/ scripts run from dev/.
+MODULES = [
+    ("main", ROOT),
+    ("batch", ROOT),
+    ("spec_index", ROOT),
+    ("sandbox", ROOT),
+    ("corpus", ROOT),
+    ("prompt_budget", ROOT),
+    ("utils", os.path.join(ROOT, "dev")),
+    ("generation", os.path.join(ROOT, "dev")),
+]
+# Packages that should only load once the stage that needs them runs.
+HEAVY = ("torch", "transformers", "faiss", "langchain", "langchain_core", "langchain_community",
+         "langchain_nvidia_ai_endpoints")
+
+# Run in a fresh interpreter so every import is cold (apart from the OS file cache).
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+try:
+    import {module}
+    error = None
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "error": error,
+                  "heavy": sorted(name for name in {heavy!r} if name in sys.modules)}}))
+"""
+
+# AppTest runs main.py the way `streamlit run` does, up to the first complete render of the page.
+RENDER_PROBE = """
+import json, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("main.py", default_timeout={timeout})
+app.run()
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "error": str(app.exception[0].value) if app.exception else None,
+                  "title": app.title[0].value if app.title else None}}))
+"""
+
+
+def probe(code, cwd):
+    """Run code in a new interpreter; returns its JSON line plus the process wall time."""
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return {"seconds": None, "wall": wall, "error": (completed.stderr.strip().splitlines() or ["failed"])[-1]}
+    return dict(json.loads(lines[-1]), wall=wall)
+
+
+def import_times(module, cwd, top=10):
+    """The slowest imports under module, from `python -X importtime` (cumulative seconds)."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=cwd, capture_output=True, text=True)
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def median(values):
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def seconds(value):
+    return f"{value:.3f}" if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import time per module and time to the first page render.")
+    parser.add_argument("--modules", nargs="+", default=[name for name, _ in MODULES])
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh processes per measurement; the median is shown.")
+    parser.add_argument("--no-render", action="store_true", help="Skip the Streamlit render measurement.")
+    parser.add_argument("--render-timeout", type=float, default=60)
+    parser.add_argument("--detail", help="Print the slowest nested imports of this module.")
+    parser.add_argument("--out", help="Also write the results as JSON here.")
+    args = parser.parse_args()
+
+    directories = dict(MODULES)
+    rows = []
+    print(f"{'module':<14} {'import s':>9} {'process s':>10}  heavy packages loaded")
+    for module in args.modules:
+        cwd = directories.get(module, ROOT)
+        runs = [probe(IMPORT_PROBE.format(module=module, heavy=HEAVY), cwd) for _ in range(args.repeat)]
+        row = {"module": module, "import": median(run["seconds"] for run in runs),
+               "process": median(run["wall"] for run in runs), "heavy": runs[-1].get("heavy", []),
+               "error": runs[-1]["error"]}
+        rows.append(row)
+        loaded = row["error"] or ", ".join(row["heavy"]) or "none"
+        print(f"{module:<14} {seconds(row['import']):>9} {seconds(row['process']):>10}  {loaded}")
+
+    render = None
+    if not args.no_render:
+        runs = [probe(RENDER_PROBE.format(timeout=args.render_timeout), ROOT) for _ in range(args.repeat)]
+        render = {"first_render": median(run["seconds"] for run in runs),
+                  "process": median(run["wall"] for run in runs), "error": runs[-1]["error"]}
+        print(f"\nfirst render of main.py: {seconds(render['first_render'])}s "
+              f"({seconds(render['process'])}s with interpreter start)"
+              + (f", error: {render['error']}" if render["error"] else ""))
+
+    if args.detail:
+        print(f"\nslowest imports under {args.detail} (cumulative):")
+        for cumulative, name in import_times(args.detail, directories.get(args.detail, ROOT)):
+            print(f"{cumulative:>8.3f}s  {name}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as file:
+            json.dump({"time": time.time(), "python": sys.version, "imports": rows, "render": render}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
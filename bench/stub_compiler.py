@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Stand-in for nvc when benchmarking without the NVIDIA HPC SDK.
+
+Takes the same command line the sandbox uses (flags, -o binary, source), sleeps to mimic
+compile time, and rejects sources without a main() with a gcc-style error. The "binary"
+it writes is a shell script that sleeps for the run time and exits 0. With -fsyntax-only
+it only does the main() check, after STUB_SYNTAX_SECONDS, and writes nothing.
+Times come from STUB_COMPILE_SECONDS, STUB_SYNTAX_SECONDS and STUB_RUN_SECONDS.
+"""
+import os
+import re
+import stat
+import sys
+import time
+
+COMPILE_SECONDS = float(os.environ.get("STUB_COMPILE_SECONDS", "0.5"))
+SYNTAX_SECONDS = float(os.environ.get("STUB_SYNTAX_SECONDS", "0.05"))
+RUN_SECONDS = float(os.environ.get("STUB_RUN_SECONDS", "0.05"))
+
+
+def main(argv):
+    output = argv[argv.index("-o") + 1] if "-o" in argv else "a.out"
+    sources = [arg for arg in argv if os.path.splitext(arg)[1] in (".c", ".cpp", ".f90")]
+    if not sources:
+        print("stub_compiler: error: no input files", file=sys.stderr)
+        return 1
+
+    syntax_only = "-fsyntax-only" in argv
+    time.sleep(SYNTAX_SECONDS if syntax_only else COMPILE_SECONDS)
+    with open(sources[0], 'r', encoding='utf-8') as file:
+        source = file.read()
+    if not re.search(r'\bmain\s*\(', source):
+        print(f"{sources[0]}:1:1: error: no main() function", file=sys.stderr)
+        return 1
+    if syntax_only:
+        return 0
+
+    with open(output, 'w') as file:
+        file.write(f"#!/bin/sh\nsleep {RUN_SECONDS}\necho 'stub test ran'\nexit 0\n")
+    os.chmod(output, os.stat(output).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
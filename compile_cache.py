@@ -0,0 +1,148 @@
+import dataclasses
+import functools
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+
+CACHE_DIR = os.path.join("cache", "compile")
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+RESULT_FILE = "result.json"
+BINARY_FILE = "test"
+# Timeouts and infrastructure errors say nothing reliable about the source, so they are never cached.
+CACHEABLE_STATUSES = {"passed", "failed", "compile_error"}
+
+
+def normalize_source(source):
+    """Ignore differences that cannot change the build: line endings, trailing blanks, outer blank lines."""
+    lines = source.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+@functools.lru_cache(maxsize=None)
+def compiler_identity(compiler):
+    path = shutil.which(compiler)
+    if path is None:
+        return f"{compiler}:missing"
+    try:
+        result = subprocess.run([path, "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                universal_newlines=True, timeout=30)
+        version = result.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        version = "unknown"
+    return f"{path}:{version}"
+
+
+def cache_key(source, suffix, compiler, flags):
+    payload = json.dumps({
+        "source": normalize_source(source),
+        "suffix": suffix,
+        "compiler": compiler_identity(compiler),
+        "flags": list(flags),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompileCache:
+    """On-disk cache of compile output, test binary and run result, keyed by cache_key().
+
+    Entries are evicted least-recently-used first once the directory grows past max_bytes.
+    The size is kept as a running total, seeded from the directory once; only crossing
+    max_bytes walks the directory again (which also picks up other processes' entries).
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self.entries())
+
+    def entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def binary_path(self, key):
+        path = os.path.join(self.entry_dir(key), BINARY_FILE)
+        return path if os.path.exists(path) else None
+
+    def contains(self, key):
+        """Whether key has a stored result. Unlike get(), it counts neither a hit nor a miss
+        and leaves the entry's LRU timestamp alone."""
+        return os.path.exists(os.path.join(self.entry_dir(key), RESULT_FILE))
+
+    def get(self, key):
+        path = os.path.join(self.entry_dir(key), RESULT_FILE)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                fields = json.load(file)
+            os.utime(path)  # mtime doubles as the LRU timestamp
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return fields
+
+    def put(self, key, fields, binary=None):
+        if fields.get("status") not in CACHEABLE_STATUSES:
+            return
+        entry_dir = self.entry_dir(key)
+        tmp_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        if binary and os.path.exists(binary):
+            shutil.copy2(binary, os.path.join(tmp_dir, BINARY_FILE))
+        with open(os.path.join(tmp_dir, RESULT_FILE), 'w', encoding='utf-8') as file:
+            json.dump(fields, file)
+        size = sum(os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir))
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Another worker stored the same entry first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        with self.lock:
+            self.total_bytes += size
+            full = self.total_bytes > self.max_bytes
+        if full:
+            self.evict()
+
+    def entries(self):
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                entry_dir = os.path.join(prefix_dir, key)
+                result_path = os.path.join(entry_dir, RESULT_FILE)
+                if key.endswith(".tmp"):
+                    continue
+                try:
+                    size = sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+                    yield os.path.getmtime(result_path), size, entry_dir
+                except OSError:
+                    # Evicted or half-written by another worker.
+                    continue
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+        with self.lock:
+            self.total_bytes = total
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def result_fields(result):
+    return {field.name: getattr(result, field.name) for field in dataclasses.fields(result) if field.name != "cached"}
@@ -0,0 +1,179 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from compile_cache import normalize_source
+
+CORPUS_PATH = "cache/corpus.sqlite"
+# A passing test older than this is regenerated rather than served; None keeps them forever.
+MAX_AGE_DAYS = 30
+
+# What a stored test was generated from. A change in any part means it may no longer apply.
+CorpusKey = namedtuple("CorpusKey", ["feature", "spec_version", "model", "prompt_hash"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tests (
+    code_hash TEXT PRIMARY KEY,
+    code TEXT NOT NULL,
+    first_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    feature TEXT NOT NULL,
+    spec_version TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    retry INTEGER NOT NULL,
+    code_hash TEXT NOT NULL REFERENCES tests(code_hash),
+    status TEXT NOT NULL,
+    exit_code INTEGER,
+    compiler_output TEXT,
+    runtime_output TEXT,
+    evaluation TEXT,
+    matrix TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attempts_by_key ON attempts (feature, spec_version, model, prompt_hash, exit_code, created);
+CREATE INDEX IF NOT EXISTS attempts_by_feature ON attempts (feature, exit_code);
+"""
+
+
+def digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def code_hash(code):
+    """Hash of the normalized test, so whitespace-only variants are stored once."""
+    return digest(normalize_source(code or ""))
+
+
+class Corpus:
+    """Every generated test and attempt, in SQLite. Tests are stored once per normalized
+    code hash; attempts point at them. Safe to share between threads."""
+
+    def __init__(self, path=CORPUS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.executescript(SCHEMA)
+            # Corpora from before the compiler matrix (see matrix.py) lack its column.
+            columns = [row["name"] for row in self.db.execute("PRAGMA table_info(attempts)")]
+            if "matrix" not in columns:
+                self.db.execute("ALTER TABLE attempts ADD COLUMN matrix TEXT")
+
+    def record_attempt(self, key, retry, attempt):
+        """Store an attempt dict (code, status, exit_code, outputs, evaluation). Returns its id."""
+        now = time.time()
+        test_hash = code_hash(attempt["code"])
+        with self.lock, self.db:
+            self.db.execute("INSERT OR IGNORE INTO tests (code_hash, code, first_seen) VALUES (?, ?, ?)",
+                            (test_hash, attempt["code"], now))
+            cursor = self.db.execute(
+                "INSERT INTO attempts (feature, spec_version, model, prompt_hash, retry, code_hash, status, exit_code,"
+                " compiler_output, runtime_output, evaluation, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, retry, test_hash, attempt["status"], attempt["exit_code"], attempt["compiler_output"],
+                 attempt["runtime_output"], attempt.get("evaluation"), now))
+            return cursor.lastrowid
+
+    def set_evaluation(self, attempt_id, evaluation):
+        with self.lock, self.db:
+            self.db.execute("UPDATE attempts SET evaluation = ? WHERE id = ?", (evaluation, attempt_id))
+
+    def set_matrix(self, attempt_id, grid):
+        with self.lock, self.db:
+            self.db.execute("UPDATE attempts SET matrix = ? WHERE id = ?", (json.dumps(grid), attempt_id))
+
+    def passing_test(self, key, max_age_days=MAX_AGE_DAYS):
+        """Newest passing attempt for key, with its code and compiler matrix grid, or None."""
+        oldest = time.time() - max_age_days * 86400 if max_age_days is not None else 0
+        with self.lock:
+            row = self.db.execute(
+                "SELECT attempts.*, tests.code FROM attempts JOIN tests USING (code_hash)"
+                " WHERE feature = ? AND spec_version = ? AND model = ? AND prompt_hash = ?"
+                " AND exit_code = 0 AND created >= ? ORDER BY created DESC LIMIT 1",
+                (*key, oldest)).fetchone()
+        if row is None:
+            return None
+        stored = dict(row)
+        stored["matrix"] = json.loads(stored["matrix"]) if stored["matrix"] else None
+        return stored
+
+    def features_without_passing_test(self, features=None, spec_version=None, model=None):
+        """Features (from the given list, or every feature ever attempted) that have no passing
+        attempt, optionally only counting passes for one spec version and model."""
+        conditions = ["passed.exit_code = 0", "passed.feature = candidates.feature"]
+        parameters = []
+        if spec_version is not None:
+            conditions.append("passed.spec_version = ?")
+            parameters.append(spec_version)
+        if model is not None:
+            conditions.append("passed.model = ?")
+            parameters.append(model)
+        no_pass = f"NOT EXISTS (SELECT 1 FROM attempts AS passed WHERE {' AND '.join(conditions)})"
+
+        with self.lock, self.db:
+            if features is None:
+                rows = self.db.execute(
+                    f"SELECT DISTINCT feature FROM attempts AS candidates WHERE {no_pass} ORDER BY feature",
+                    parameters).fetchall()
+                return [row["feature"] for row in rows]
+            self.db.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (feature TEXT PRIMARY KEY, position INTEGER)")
+            self.db.execute("DELETE FROM wanted")
+            self.db.executemany("INSERT OR IGNORE INTO wanted VALUES (?, ?)",
+                                [(feature, i) for i, feature in enumerate(features)])
+            rows = self.db.execute(
+                f"SELECT feature FROM wanted AS candidates WHERE {no_pass} ORDER BY position", parameters).fetchall()
+        return [row["feature"] for row in rows]
+
+    def stats(self):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT (SELECT COUNT(*) FROM attempts) AS attempts, (SELECT COUNT(*) FROM tests) AS tests,"
+                " (SELECT COUNT(DISTINCT feature) FROM attempts) AS features,"
+                " (SELECT COUNT(DISTINCT feature) FROM attempts WHERE exit_code = 0) AS passing_features").fetchone()
+        return dict(row)
+
+    def close(self):
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the generated test corpus.")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Attempt, test and feature counts.")
+    gaps = subparsers.add_parser("gaps", help="Features without a passing test.")
+    gaps.add_argument("features", nargs="?", help="Text file with one feature per line; default every feature seen.")
+    gaps.add_argument("--out", help="Write the gaps here, one per line, ready for batch.py.")
+    args = parser.parse_args()
+
+    corpus = Corpus(args.corpus)
+    if args.command == "stats":
+        for name, value in corpus.stats().items():
+            print(f"{name}: {value}")
+        return
+
+    features = None
+    if args.features:
+        with open(args.features, 'r', encoding='utf-8') as file:
+            features = [line.strip() for line in file if line.strip()]
+    missing = corpus.features_without_passing_test(features)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as file:
+            file.write("".join(feature + "\n" for feature in missing))
+        print(f"{len(missing)} features without a passing test written to {args.out}")
+    else:
+        print("\n".join(missing))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import time
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, DynamicCache, StoppingCriteriaList
+
+from generation import StopOnClosedFence
+from utils import prompt_prefix, tracer
+
+BATCH_SIZE = 8
+MAX_NEW_TOKENS = 1024
+SAMPLING = {"do_sample": True, "top_p": 0.75, "top_k": 40, "temperature": 0.12}
+
+
+class BatchGenerator:
+    """Generates completions for many prompts at once.
+
+    Every prompt starts with the same "### System: ... ### User:" prefix, so its KV cache is
+    computed once and reused by each batch; only the per-prompt suffix is run through the
+    model. Suffixes are left-padded, which puts the padding between prefix and suffix where
+    the attention mask hides it.
+    """
+
+    def __init__(self, model, tokenizer, system, batch_size=BATCH_SIZE, max_new_tokens=MAX_NEW_TOKENS,
+                 device=None, **sampling):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix = prompt_prefix(system)
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.device = device or model.device
+        self.sampling = sampling or SAMPLING
+        self.prefix_ids = tokenizer(self.prefix, return_tensors="pt").input_ids.to(self.device)
+        self.prefix_cache = None
+        self.generated_tokens = 0
+        self.generation_seconds = 0.0
+
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+    def _prefix_cache(self):
+        if self.prefix_cache is None:
+            with torch.no_grad():
+                past = self.model(self.prefix_ids, use_cache=True).past_key_values
+            self.prefix_cache = past.to_legacy_cache() if hasattr(past, "to_legacy_cache") else past
+        return self.prefix_cache
+
+    def _expanded_cache(self, batch_size):
+        # generate() appends to the cache in place, so each batch gets its own copy.
+        layers = tuple((key.expand(batch_size, *key.shape[1:]).contiguous(),
+                        value.expand(batch_size, *value.shape[1:]).contiguous())
+                       for key, value in self._prefix_cache())
+        return DynamicCache.from_legacy_cache(layers)
+
+    def _generate_batch(self, prompts):
+        suffixes = []
+        for prompt in prompts:
+            if not prompt.startswith(self.prefix):
+                raise ValueError("Prompt does not start with the shared system prefix")
+            suffixes.append(prompt[len(self.prefix):])
+
+        self.tokenizer.padding_side = "left"
+        encoded = self.tokenizer(suffixes, return_tensors="pt", padding=True, add_special_tokens=False).to(self.device)
+        batch_size = encoded.input_ids.shape[0]
+        prefix_ids = self.prefix_ids.expand(batch_size, -1)
+        input_ids = torch.cat([prefix_ids, encoded.input_ids], dim=1)
+        attention_mask = torch.cat([torch.ones_like(prefix_ids), encoded.attention_mask], dim=1)
+        prompt_length = input_ids.shape[1]
+
+        start = time.perf_counter()
+        with torch.no_grad(), tracer.span("generate", batch_size=batch_size,
+                                          prompt_tokens=int(attention_mask.sum())) as span:
+            output_ids = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                past_key_values=self._expanded_cache(batch_size),
+                max_new_tokens=self.max_new_tokens,
+                pad_token_id=self.tokenizer.pad_token_id,
+                stopping_criteria=StoppingCriteriaList([StopOnClosedFence(self.tokenizer, prompt_length)]),
+                **self.sampling,
+            )
+            new_ids = output_ids[:, prompt_length:]
+            completion_tokens = int((new_ids != self.tokenizer.pad_token_id).sum())
+            span.set(completion_tokens=completion_tokens)
+        self.generation_seconds += time.perf_counter() - start
+        self.generated_tokens += completion_tokens
+
+        completions = self.tokenizer.batch_decode(new_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)
+        return [completion.split("\n\n\n")[0] for completion in completions]
+
+    def generate(self, prompts):
+        """Completions for prompts, in order, batch_size at a time (similar lengths batched together)."""
+        order = sorted(range(len(prompts)), key=lambda i: len(prompts[i]))
+        completions = [None] * len(prompts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, completion in zip(batch, self._generate_batch([prompts[i] for i in batch])):
+                completions[i] = completion
+        return completions
+
+    def tokens_per_second(self):
+        return self.generated_tokens / self.generation_seconds if self.generation_seconds else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput check for the batched generator.")
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2", help="Any causal LM; tiny ones run fine on CPU.")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--num-prompts", type=int, default=16)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model).to(args.device)
+    system = "Write OpenACC compiler validation tests"
+    generator = BatchGenerator(model, tokenizer, system, args.batch_size, args.max_new_tokens, args.device)
+    prompts = [prompt_prefix(system) + f"Write a test for feature #{i}.\n\n### Response:\n" for i in range(args.num_prompts)]
+
+    generator.generate(prompts)
+    print(f"{len(prompts)} prompts, batch size {args.batch_size}: "
+          f"{generator.generated_tokens} tokens in {generator.generation_seconds:.2f}s "
+          f"({generator.tokens_per_second():.1f} tokens/s)")
+
+
+if __name__ == "__main__":
+    main()
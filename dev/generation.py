@@ -0,0 +1,43 @@
+# The model side of the dev scripts: needs torch and transformers, unlike utils.py.
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+
+from utils import build_prompt, tracer  # puts the repo root on sys.path
+from fences import fence_closed
+
+
+class StopOnClosedFence(StoppingCriteria):
+    """Stops generate() once the first ``` code block of the completion has closed.
+
+    Works per row, so in a batch each sequence stops on its own fence.
+    """
+
+    def __init__(self, tokenizer, prompt_length):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids, scores, **kwargs):
+        completions = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=True)
+        return torch.tensor([fence_closed(completion) for completion in completions], device=input_ids.device)
+
+
+def generate_one_completion(system: str, instruction: str, model, tokenizer, input: str = None,
+                            previous_code: str = None, compiler_output: str = None, runtime_output: str = None):
+    prompt = build_prompt(system, instruction, tokenizer, input, previous_code, compiler_output, runtime_output)
+
+    # No truncation here: build_prompt already fit the prompt, and truncating could cut the instruction.
+    inputs = tokenizer(prompt, return_tensors="pt")
+    print(f'prompt len: {len(inputs.input_ids[0])} tokens')
+    
+    with torch.no_grad(), tracer.span("generate", prompt_tokens=len(inputs.input_ids[0])) as span:
+        stopping_criteria = StoppingCriteriaList([StopOnClosedFence(tokenizer, inputs.input_ids.shape[1])])
+        generate_ids = model.generate(inputs.input_ids.to("cuda"), max_new_tokens=1024, do_sample=True, top_p=0.75, top_k=40, temperature=0.12,
+                                      stopping_criteria=stopping_criteria)
+        span.set(completion_tokens=generate_ids.shape[1] - inputs.input_ids.shape[1])
+
+    completion = tokenizer.batch_decode(generate_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)[0]
+    completion = completion.replace(prompt, "").split("\n\n\n")[0]
+
+    # No torch.cuda.empty_cache() here: flushing after every call defeats the caching
+    # allocator, and the next generate() needs the same blocks again.
+    return completion
@@ -1,15 +1,27 @@
+import argparse
+import time
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer
 import jsonlines
-from utils import generate_one_completion, parse_output, compile_and_run_test
+from utils import build_prompt, parse_output, submit_compile_and_run
+from diagnostics import compact_feedback
+from precheck import REJECTED
+from sandbox import LAUNCH_ERROR
+from batch_engine import BatchGenerator
+from results_log import RESULTS_FILE, ResultsLog, in_shard, prompt_key, shard_path
 
 MODEL_PATH = "Phind/Phind-CodeLlama-34B-v2" 
 MAX_RETRIES = 3
+BATCH_SIZE = 8
+SYSTEM = "Write OpenACC compiler validation tests"
+PROMPTS_FILE = "prompts/prompts.jl"
+COMPILE_FAILURES = ("compile_error", "compile_timeout", LAUNCH_ERROR, REJECTED)
 num_gpu = torch.cuda.device_count()
 
 print(f'####### Num GPU: {num_gpu}')
 print(f'####### Model: {MODEL_PATH}')
 print(f'####### Max retries: {MAX_RETRIES}')
+print(f'####### Batch size: {BATCH_SIZE}')
 
 def load_model(model_path):
     """Loads model and tokenizer."""
@@ -17,46 +29,98 @@ def load_model(model_path):
     model = AutoModelForCausalLM.from_pretrained(model_path, device_map='auto')
     return model, tokenizer
 
-def run_test():
-    """Runs the parsed test using nvc."""
-    test_file = "parsedTest.c"
-    return compile_and_run_test(test_file)
+def run_test(code, feature=None):
+    """Runs the parsed test using nvc in an isolated sandbox; returns a Future."""
+    return submit_compile_and_run(code, feature=feature)
+
+def load_jobs(prompts_file, log, shard=0, num_shards=1):
+    """Jobs for this shard's prompts that the log does not mark finished; unfinished
+    prompts pick up at their next retry with the logged feedback."""
+    finished = log.finished()
+    resume = log.last_attempts()
+    jobs = []
+    with jsonlines.open(prompts_file) as reader:
+        for position, line in enumerate(reader):
+            idx = prompt_key(line, position)
+            if idx in finished or not in_shard(idx, shard, num_shards):
+                continue
+            job = {"idx": idx, "line": line, "retry": 0, "feedback": {}}
+            if idx in resume:
+                last = resume[idx]
+                job["retry"] = last["retry"] + 1
+                job["feedback"] = {"previous_code": last["code"], "compiler_output": last["feedback"]}
+            jobs.append(job)
+    return jobs, len(finished)
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate, compile and retry tests for every prompt.")
+    parser.add_argument("--prompts", default=PROMPTS_FILE)
+    parser.add_argument("--log", default=RESULTS_FILE, help="Append-only results log; rerunning resumes from it.")
+    parser.add_argument("--shard", type=int, default=0, help="This worker's shard, 0-based.")
+    parser.add_argument("--num-shards", type=int, default=1, help="Split the prompts across this many workers.")
+    args = parser.parse_args()
+
+    log = ResultsLog(shard_path(args.log, args.shard, args.num_shards))
+    pending, done = load_jobs(args.prompts, log, args.shard, args.num_shards)
+    print(f"###### Log: {log.path}, {done} prompts already finished, {len(pending)} to go")
+    if not pending:
+        return
+
     model, tokenizer = load_model(MODEL_PATH)
+    generator = BatchGenerator(model, tokenizer, SYSTEM, batch_size=BATCH_SIZE)
 
-    with jsonlines.open("prompts/prompts.jl") as reader:
-        for line in reader:
-            prompt = line["Instruction"]
-            original_instruction = prompt
-            for retry in range(MAX_RETRIES + 1):
-                print(f"###### Generating test, try #{retry + 1}...")
-                response = generate_one_completion("Write OpenACC compiler validation tests", prompt, model, tokenizer)
-                print("="*30)
-                print(f'###### Prompt:\n {prompt}')
-                # print(f"###### Response:\n {response}")
-                # print("="*30)
-                code = parse_output(response)
-                exit_code, compiler_output, runtime_output = run_test()
-                print(f"Generated Test: {code}")
-                print("="*30)
-                print(f"###### Exit code: {exit_code}")
-                print(f"###### Compiler output:\n {compiler_output}")
-                print(f"###### Runtime output:\n {runtime_output}")
-                print("="*30)
-                if exit_code == 0:
-                    print(f"###### Test passed. num retries: {retry}")
-                    break
-                else:
-                    print("###### Test failed.")
-                    prompt = original_instruction + f"\nResponse: {code}\n\nTest failed.\nRetry based on compiler output: {compiler_output}\nruntime output: {runtime_output}\n"
+    # Fresh prompts and retries share one queue, so every batch is as full as possible.
+    while pending:
+        batch, pending = pending[:BATCH_SIZE], pending[BATCH_SIZE:]
+        prompts = [build_prompt(SYSTEM, job["line"]["Instruction"], tokenizer, **job["feedback"]) for job in batch]
+        print(f"###### Generating {len(batch)} tests...")
+        start = time.perf_counter()
+        responses = generator.generate(prompts)
+        generate_seconds = time.perf_counter() - start
+        codes = [parse_output(response) for response in responses]
+        # No feature matching: an Instruction is boilerplate plus pasted spec text, not a feature name.
+        futures = [run_test(code) for code in codes]
+
+        for job, code, future in zip(batch, codes, futures):
+            result = future.result()
+            exit_code, compiler_output, runtime_output = result.as_tuple()
+            print("="*30)
+            print(f'###### Prompt idx {job["idx"]}, try #{job["retry"] + 1}')
+            print(f"Generated Test: {code}")
+            print("="*30)
+            print(f"###### Exit code: {exit_code}")
+            print(f"###### Compiler output:\n {compiler_output}")
+            print(f"###### Runtime output:\n {runtime_output}")
+            print("="*30)
+            # Diagnostics are compacted to errors/warnings plus the exit status (see diagnostics.py).
+            # A precheck rejection is already a list of problems (see precheck.py).
+            feedback = compiler_output if result.status == REJECTED else compact_feedback(
+                compiler_output, code, exit_code, runtime_output, compiled=result.status not in COMPILE_FAILURES)
+            final = exit_code == 0 or job["retry"] >= MAX_RETRIES
+            log.append({
+                "idx": job["idx"], "retry": job["retry"], "final": final,
+                "code": code, "status": result.status, "exit_code": exit_code,
+                "compiler_output": compiler_output, "runtime_output": runtime_output, "feedback": feedback,
+                # generate_seconds is for the whole batch the attempt was generated in.
+                "timings": {"generate_seconds": round(generate_seconds, 3), "batch_size": len(batch),
+                            "compile_seconds": round(result.compile_seconds, 3),
+                            "run_seconds": round(result.run_seconds, 3), "cached": result.cached},
+            })
+            if exit_code == 0:
+                print(f"###### Test passed. num retries: {job['retry']}")
+            elif not final:
+                print("###### Test failed.")
+                # Only the latest attempt is fed back, within the prompt budget (see utils.build_prompt).
+                job["retry"] += 1
+                job["feedback"] = {"previous_code": code, "compiler_output": feedback}
+                pending.append(job)
             else:
                 print("###### Maximum retries reached.")
-                if exit_code == 0:
-                    print("###### Final Test passed. (shouldnt happen right?)")
-                else:
-                    print("###### Final Test failed.")
-                print("="*30) 
+                print("###### Final Test failed.")
+                print("="*30)
+
+    log.close()
+    print(f"###### Generated {generator.generated_tokens} tokens at {generator.tokens_per_second():.1f} tokens/s")
 
 if __name__ == "__main__":
     main()
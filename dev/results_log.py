@@ -0,0 +1,139 @@
+import argparse
+import glob
+import json
+import os
+import zlib
+
+RESULTS_FILE = "results.jsonl"
+
+
+def prompt_key(line, position):
+    """Stable identifier of a prompt: its idx, or its position in the prompt file."""
+    return line.get("idx", position)
+
+
+def in_shard(key, shard, num_shards):
+    """Whether a prompt belongs to shard (0-based) of num_shards; the same on every host."""
+    if num_shards <= 1:
+        return True
+    value = key if isinstance(key, int) else zlib.crc32(str(key).encode('utf-8'))
+    return value % num_shards == shard
+
+
+def shard_path(path, shard, num_shards):
+    """results.jsonl -> results.shard-1-of-4.jsonl, so shards never share a file."""
+    if num_shards <= 1:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}.shard-{shard}-of-{num_shards}{ext}"
+
+
+def read_records(path):
+    """Records in a log, skipping a line torn by a crash mid-write."""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r', encoding='utf-8') as file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"{path}:{number}: skipping unreadable record")
+    return records
+
+
+def ends_with_newline(path):
+    with open(path, 'rb') as file:
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b"\n"
+
+
+class ResultsLog:
+    """Append-only JSONL log with one record per attempt.
+
+    A record with "final": true closes its prompt (passed, or out of retries). Each append is
+    flushed and fsynced, so after a crash the log holds every attempt that finished.
+    """
+
+    def __init__(self, path=RESULTS_FILE):
+        self.path = path
+        self.records = read_records(path)
+        self.file = open(path, 'a', encoding='utf-8')
+        if self.file.tell() and not ends_with_newline(path):
+            self.file.write("\n")  # start after a torn last line instead of extending it
+
+    def append(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.records.append(record)
+
+    def finished(self):
+        return {record["idx"] for record in self.records if record.get("final")}
+
+    def last_attempts(self):
+        """Latest attempt of every prompt that is not finished, to resume from."""
+        latest = {}
+        for record in self.records:
+            if record["idx"] not in latest or record["retry"] >= latest[record["idx"]]["retry"]:
+                latest[record["idx"]] = record
+        done = self.finished()
+        return {idx: record for idx, record in latest.items() if idx not in done}
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def merge(paths, out_path):
+    """Merge shard logs into one, keeping one record per (idx, retry). Returns the record count."""
+    merged = {}
+    for path in paths:
+        for record in read_records(path):
+            merged[(str(record["idx"]), record["retry"])] = record
+    records = sorted(merged.values(), key=lambda r: (str(r["idx"]).zfill(12), r["retry"]))
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+    os.replace(tmp_path, out_path)
+    return len(records)
+
+
+def summarize(records):
+    finals = [record for record in records if record.get("final")]
+    passed = [record for record in finals if record["exit_code"] == 0]
+    print(f"{len(records)} attempts, {len(finals)} prompts finished, {len(passed)} passed")
+    if passed:
+        retries = sum(record["retry"] for record in passed) / len(passed)
+        print(f"average retries to pass: {retries:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge and summarize iterative.py results logs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    merge_parser = subparsers.add_parser("merge", help="Merge shard logs into one file.")
+    merge_parser.add_argument("logs", nargs="+", help="Shard logs or glob patterns.")
+    merge_parser.add_argument("--out", default=RESULTS_FILE)
+    summary_parser = subparsers.add_parser("summary", help="Pass counts for a log.")
+    summary_parser.add_argument("log", nargs="?", default=RESULTS_FILE)
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        paths = sorted({path for pattern in args.logs for path in glob.glob(pattern)})
+        count = merge(paths, args.out)
+        print(f"Merged {len(paths)} logs into {args.out} ({count} records)")
+        summarize(read_records(args.out))
+    else:
+        summarize(read_records(args.log))
+
+
+if __name__ == "__main__":
+    main()
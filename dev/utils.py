@@ -1,29 +1,48 @@
-import torch
+# Prompt building and the compile/parse helpers. Nothing here needs torch or transformers,
+# so the compile side can run on machines without the ML stack; the model side is in generation.py.
 import os 
-import subprocess
+import sys
 import re 
-
-def generate_one_completion(system: str, instruction: str, model, tokenizer, input: str = None):
-    if input:
-        prompt = f"### System:\n{system}\n\n### User:\n{instruction}\n\n### Input:\n{input}\n\n### Response:\n"
-    else:
-        prompt = f"### System:\n{system}\n\n### User:\n{instruction}\n\n### Response:\n"
-
-    inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=2048)
-    print(f'prompt len: {len(inputs.input_ids[0])} tokens')
-    
-    with torch.no_grad():
-        generate_ids = model.generate(inputs.input_ids.to("cuda"), max_new_tokens=1024, do_sample=True, top_p=0.75, top_k=40, temperature=0.12)
-
-    completion = tokenizer.batch_decode(generate_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)[0]
-    completion = completion.replace(prompt, "").split("\n\n\n")[0]
-    
-    # Freeing up GPU memory explicitly
-    del inputs
-    del generate_ids
-    torch.cuda.empty_cache()
-
-    return completion
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sandbox import COMPILERS, get_default_pool
+from precheck import precheck
+from prompt_budget import Section, assemble, tokenizer_counter
+from tracing import get_tracer, record_sandbox
+
+MAX_PROMPT_TOKENS = 2048
+PREVIOUS_CODE_TOKENS = 700
+DIAGNOSTIC_TOKENS = 300
+
+tracer = get_tracer()
+
+
+def prompt_prefix(system: str):
+    """The part of every prompt that precedes the instruction; batch_engine caches its KV state."""
+    return f"### System:\n{system}\n\n### User:\n"
+
+def build_prompt(system: str, instruction: str, tokenizer, input: str = None, previous_code: str = None,
+                 compiler_output: str = None, runtime_output: str = None):
+    """Budgeted prompt: the system text, instruction and response marker are never cut; retry
+    feedback and input are trimmed (lowest priority first) to fit MAX_PROMPT_TOKENS."""
+    sections = [
+        Section("system", prompt_prefix(system), required=True),
+        Section("instruction", instruction, required=True),
+        Section("previous_code", previous_code or "", header="\nResponse: ", footer="\n\nTest failed.\n",
+                budget=PREVIOUS_CODE_TOKENS, priority=0),
+        Section("compiler_output", compiler_output or "", header="Retry based on compiler output: ", footer="\n",
+                budget=DIAGNOSTIC_TOKENS, priority=2),
+        Section("runtime_output", runtime_output or "", header="runtime output: ", footer="\n",
+                budget=DIAGNOSTIC_TOKENS, priority=1, keep="tail"),
+        Section("input", input or "", header="\n\n### Input:\n", priority=3),
+        Section("response", "\n\n### Response:\n", required=True),
+    ]
+    prompt, report = assemble(sections, MAX_PROMPT_TOKENS, tokenizer_counter(tokenizer))
+    for name, (kept, original) in report.items():
+        if kept < original:
+            print(f'prompt budget: {name} trimmed from {original} to {kept} tokens')
+    return prompt
 
 
 def parse_output(text):
@@ -40,12 +59,6 @@ def parse_output(text):
     if code_matches:
         code = code_matches[-1].strip()
         print(f"Code found. Length: {len(code)} characters.")
-
-        output_file_path = "parsedTest.c"
-        with open(output_file_path, 'w', encoding='utf-8') as output_file:
-            output_file.write(code)
-            
-        print(f"Saved code to {output_file_path}")
         return code
     else:
         print("Code not found.")
@@ -54,37 +67,49 @@ def parse_output(text):
     return code
 
 
+def compile_and_run_result(code, suffix=".c", feature=None):
+    # Builds and runs in a private temp directory with time/memory limits (see sandbox.py),
+    # so several sweeps can share a machine. Obviously broken tests are turned away first
+    # (see precheck.py).
+    rejected = precheck(code or "", feature, suffix, tracer=tracer)
+    if rejected is not None:
+        return rejected
+    result = get_default_pool().run(code or "", suffix)
+    record_sandbox(result, tracer)
+    return result
+
+
+def submit_compile_and_run(code, suffix=".c", feature=None):
+    """Non-blocking variant: returns a Future of the SandboxResult. Only the static prechecks
+    run here, since the syntax-only pass would block the caller."""
+    def record(done):
+        if done.exception() is None:
+            record_sandbox(done.result(), tracer)
+
+    rejected = precheck(code or "", feature, suffix, syntax=False, tracer=tracer)
+    if rejected is not None:
+        future = Future()
+        future.set_result(rejected)
+        return future
+    future = get_default_pool().submit(code or "", suffix)
+    future.add_done_callback(record)
+    return future
+
+
+def compile_and_run_code(code, suffix=".c"):
+    return compile_and_run_result(code, suffix).as_tuple()
+
+
 def compile_and_run_test(test_file):
     try:
-        base_name = os.path.splitext(os.path.basename(test_file))[0]
-        build_path = os.path.join('build', base_name)
-
-        if test_file.endswith(".c"):
-            compile_command = f"nvc -acc -Minfo=all -o {build_path} {test_file}"
-        elif test_file.endswith(".cpp"):
-            compile_command = f"nvc++ -acc -Minfo=all -o {build_path} {test_file}"  # Update this command as needed
-        elif test_file.endswith(".f90"):
-            compile_command = f"nvfortran -acc -Minfo=all -o {build_path} {test_file}"  # Update this command as needed
-        else:
+        suffix = os.path.splitext(test_file)[1]
+        if suffix not in COMPILERS:
             print("Unsupported file type.")
             return 1, "Unsupported file type", ""
 
-        # Compile 
-        os.makedirs('build', exist_ok=True)
-        compile_result = subprocess.run(compile_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-        compile_output = compile_result.stderr.strip() if compile_result.stderr else compile_result.stdout.strip()
-        compile_exit_code = compile_result.returncode
-
-        if compile_exit_code != 0:
-            return compile_exit_code, compile_output, ""
-
-        # Run 
-        run_command = f"./{build_path}"
-        run_result = subprocess.run(run_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-        run_output = run_result.stdout.strip() if run_result.stdout else run_result.stderr.strip()
-        run_exit_code = run_result.returncode
-
-        return run_exit_code, compile_output, run_output
+        with open(test_file, 'r', encoding='utf-8') as file:
+            code = file.read()
+        return compile_and_run_code(code, suffix)
 
     except Exception as e:
         return 1, f"An error occurred: {str(e)}", ""
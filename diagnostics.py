@@ -0,0 +1,122 @@
+import re
+from dataclasses import dataclass, asdict
+
+MAX_WARNINGS = 5
+RAW_FALLBACK_LINES = 20
+RUNTIME_OUTPUT_LINES = 20
+
+SEVERITIES = ("error", "warning", "info")
+NVHPC_SEVERITY = {"F": "error", "S": "error", "W": "warning", "I": "info"}
+
+# gcc / clang:  test.c:5:13: error: 'x' undeclared
+GNU_PATTERN = re.compile(r'^(?P<file>[^\s:][^:]*):(?P<line>\d+):(?:(?P<column>\d+):)?\s*'
+                         r'(?P<severity>fatal error|error|warning|note|remark):\s*(?P<message>.*)$')
+# nvc/nvc++/nvfortran (EDG front end):  "test.c", line 5: error: identifier "x" is undefined
+EDG_PATTERN = re.compile(r'^"(?P<file>[^"]+)", line (?P<line>\d+):\s*(?P<severity>catastrophic error|error|warning|remark)'
+                         r'(?: #\d+-D)?:\s*(?P<message>.*)$')
+# Older NVHPC style:  NVC++-S-0020-Identifier is undefined (test.c: 5)
+NVHPC_PATTERN = re.compile(r'^(?:NVC\+\+|NVC|NVFORTRAN|PGC\+\+|PGC|PGF90)-(?P<severity>[FSWI])-\d+-(?P<message>.*?)'
+                           r'(?:\s*\((?P<file>[^:()]+):\s*(?P<line>\d+)\))?$')
+LINKER_PATTERN = re.compile(r'(undefined reference to|ld(?:\.\w+)?: |collect2: error|cannot find -l)')
+# -Minfo chatter: "main:" headers and "     12, Generating implicit copy(...)" notes.
+MINFO_PATTERN = re.compile(r'^\s*(?:\d+, .*|[A-Za-z_]\w*:|\s+\S.*)$')
+
+
+@dataclass
+class Diagnostic:
+    severity: str  # error, warning or info
+    message: str
+    line: int = None
+    column: int = None
+    file: str = None
+    source: str = None  # the offending line of the test, when known
+
+
+def normalize_severity(severity):
+    severity = severity.lower()
+    if severity in ("error", "fatal error", "catastrophic error"):
+        return "error"
+    if severity == "warning":
+        return "warning"
+    return "info"
+
+
+def parse_diagnostics(output, source=None):
+    """Classify compiler output into errors, warnings and info, deduplicated, with the
+    offending source line attached where the compiler gave a line number."""
+    source_lines = source.splitlines() if source else []
+    diagnostics = []
+    seen = set()
+
+    def add(severity, message, line=None, column=None, file=None):
+        line = int(line) if line else None
+        key = (severity, line, message.strip())
+        if key in seen:
+            return
+        seen.add(key)
+        text = source_lines[line - 1].strip() if line and 0 < line <= len(source_lines) else None
+        diagnostics.append(Diagnostic(severity, message.strip(), line, int(column) if column else None, file, text))
+
+    for raw in (output or "").splitlines():
+        match = GNU_PATTERN.match(raw) or EDG_PATTERN.match(raw)
+        if match:
+            add(normalize_severity(match.group("severity")), match.group("message"), match.group("line"),
+                match.groupdict().get("column"), match.group("file"))
+            continue
+        match = NVHPC_PATTERN.match(raw.strip())
+        if match:
+            add(NVHPC_SEVERITY[match.group("severity")], match.group("message"), match.group("line"),
+                file=match.group("file"))
+            continue
+        if LINKER_PATTERN.search(raw):
+            add("error", raw.strip())
+            continue
+        if raw.strip() and MINFO_PATTERN.match(raw):
+            continue  # source excerpts, carets and -Minfo notes
+        if raw.strip():
+            add("info", raw.strip())
+
+    return diagnostics
+
+
+def format_diagnostic(diagnostic):
+    where = f"line {diagnostic.line}: " if diagnostic.line else ""
+    text = f"{diagnostic.severity}: {where}{diagnostic.message}"
+    if diagnostic.source:
+        text += f"\n    {diagnostic.source}"
+    return text
+
+
+def tail(text, lines):
+    return "\n".join((text or "").strip().splitlines()[-lines:])
+
+
+def compact_feedback(compile_output, source=None, exit_code=None, runtime_output=None, compiled=False):
+    """The slice of an attempt's output worth sending back to the model: errors and a
+    few warnings with their source lines, plus how the test exited. -Minfo notes are dropped."""
+    diagnostics = parse_diagnostics(compile_output, source)
+    errors = [d for d in diagnostics if d.severity == "error"]
+    warnings = [d for d in diagnostics if d.severity == "warning"]
+
+    parts = [format_diagnostic(d) for d in errors]
+    parts += [format_diagnostic(d) for d in warnings[:MAX_WARNINGS]]
+    if len(warnings) > MAX_WARNINGS:
+        parts.append(f"({len(warnings) - MAX_WARNINGS} more warnings)")
+
+    if not compiled:
+        if not errors and compile_output:
+            # Nothing recognizable; the end of the raw output is the best we have.
+            parts.append(tail(compile_output, RAW_FALLBACK_LINES))
+        parts.append(f"Compilation failed (exit status {exit_code}).")
+    else:
+        parts.append(f"The test compiled and exited with status {exit_code}.")
+        if runtime_output:
+            parts.append(f"Runtime output:\n{tail(runtime_output, RUNTIME_OUTPUT_LINES)}")
+
+    return "\n".join(parts)
+
+
+def diagnostics_table(compile_output, source=None, severities=("error", "warning")):
+    """Rows for display, most severe first."""
+    rows = [asdict(d) for d in parse_diagnostics(compile_output, source) if d.severity in severities]
+    return sorted(rows, key=lambda row: SEVERITIES.index(row["severity"]))
@@ -0,0 +1,16 @@
+FENCE = "```"
+# Language tags a fence may open with; extract_code() keeps them as the snippet's first line.
+LANGUAGE_TAGS = {"c", "c++", "cpp", "cxx", "fortran", "f90"}
+
+
+def extract_code(content):
+    code_snippet = content.split(FENCE)[1] if FENCE in content else ""
+    return code_snippet.strip()
+
+
+def fence_closed(text):
+    """True once text contains everything extract_code() keeps, i.e. the first code block has closed.
+
+    Anything generated after that point is thrown away, so streaming callers stop here.
+    """
+    return text.count(FENCE) >= 2
@@ -0,0 +1,134 @@
+import contextvars
+import threading
+import weakref
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POOL_SIZE = 32
+DEFAULT_CONCURRENCY = 16
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 120  # between bytes, so a long streamed generation is fine
+RETRIES = 4
+BACKOFF_SECONDS = 0.5  # doubled on every retry, unless the server sends Retry-After
+RETRY_STATUSES = (429, 503)
+
+# Streamed responses opened inside a streaming() block, closed when it exits.
+_open_streams = contextvars.ContextVar("open_streams", default=None)
+
+
+class EndpointSession(requests.Session):
+    """requests.Session for one endpoint: keep-alive pool, default timeouts, retry with
+    backoff on 429/503 and a cap on requests in flight.
+
+    A streamed response keeps its slot until it is closed or garbage collected, so a
+    generation counts against the limit until the caller hangs up. Callers that stop
+    reading early should do so inside streaming(), which closes the response for them.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_CONCURRENCY, pool_size=POOL_SIZE,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=RETRIES, backoff=BACKOFF_SECONDS):
+        super().__init__()
+        retry = Retry(
+            total=retries, connect=retries, read=0, status=retries,
+            status_forcelist=RETRY_STATUSES, allowed_methods=None,  # inference POSTs are safe to resend
+            backoff_factor=backoff, respect_retry_after_header=True, raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        self.slots.acquire()
+        release = release_once(self.slots)
+        try:
+            response = super().request(method, url, **kwargs)
+        except BaseException:
+            release()
+            raise
+        if not kwargs.get("stream"):
+            release()
+            return response
+
+        close = response.close
+
+        def close_and_release():
+            close()
+            release()
+
+        response.close = close_and_release
+        weakref.finalize(response, release)
+        opened = _open_streams.get()
+        if opened is not None:
+            opened.append(response)
+        return response
+
+
+@contextmanager
+def streaming():
+    """Close streamed responses opened in this block (or in executor threads it spawned with
+    a copy of its context) on exit. The chat client doesn't close a stream it stops reading,
+    and the response can outlive it in a reference cycle, holding its connection and slot."""
+    opened = []
+    token = _open_streams.set(opened)
+    try:
+        yield
+    finally:
+        _open_streams.reset(token)
+        for response in opened:
+            response.close()
+
+
+def release_once(semaphore):
+    lock = threading.Lock()
+    released = False
+
+    def release():
+        nonlocal released
+        with lock:
+            if released:
+                return
+            released = True
+        semaphore.release()
+
+    return release
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def endpoint_key(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url, max_concurrency=None):
+    """The shared session for url's host and port, created on first use.
+
+    max_concurrency only applies when the session is created.
+    """
+    key = endpoint_key(url)
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = EndpointSession(max_concurrency or DEFAULT_CONCURRENCY)
+        return _sessions[key]
+
+
+def pooled(client, max_concurrency=None):
+    """Route a ChatNVIDIA or NVIDIAEmbeddings client through the shared session for its endpoint.
+
+    The client otherwise opens a new session (and connection) for every request. Its async
+    methods run the sync ones on executor threads, so async callers share the same pool and limit.
+    """
+    session = get_session(client.base_url, max_concurrency)
+    client._client.get_session_fn = lambda: session
+    return client
+
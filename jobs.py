@@ -0,0 +1,563 @@
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+JOBS_PATH = "cache/jobs.sqlite"
+JOB_SERVER_URL = "http://127.0.0.1:8765"
+# Features run at once. RESERVED_WORKERS of them only take interactive jobs, so a request
+# from the UI never waits behind a full sweep.
+WORKERS = 8
+RESERVED_WORKERS = 2
+# Lower runs first.
+PRIORITIES = {"interactive": 0, "bulk": 10}
+POLL_SECONDS = 0.5
+# Several servers may share the database (e.g. the one embedded in Streamlit and `jobs.py serve`).
+# Each marks the jobs it runs as its own and touches them every HEARTBEAT_SECONDS; a running
+# job whose server has been silent for STALE_SECONDS is taken to be orphaned and requeued.
+HEARTBEAT_SECONDS = 5
+STALE_SECONDS = 30
+ACTIVE = ("queued", "running")
+FINISHED = ("passed", "failed", "error", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    feature TEXT NOT NULL,
+    item TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    candidates INTEGER NOT NULL,
+    force INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    progress TEXT,
+    attempts TEXT NOT NULL DEFAULT '[]',
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    heartbeat REAL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, priority, id);
+"""
+SUMMARY_COLUMNS = "id, feature, priority, candidates, force, status, progress, error, created, started, finished"
+
+
+def to_json(value):
+    return json.dumps(value, default=str)
+
+
+class JobQueue:
+    """Submitted features, in SQLite so queued work survives a restart. Safe to share between threads."""
+
+    def __init__(self, path=JOBS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.executescript(SCHEMA)
+            # Databases from before servers were told apart lack these columns.
+            columns = [row["name"] for row in self.db.execute("PRAGMA table_info(jobs)")]
+            for column in ("owner TEXT", "heartbeat REAL"):
+                if column.split()[0] not in columns:
+                    self.db.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+
+    def submit(self, items, priority="bulk", candidates=1, force=False):
+        """Queue one job per item (a batch.py item: feature, prompt, context). Returns their ids.
+
+        An item that is already queued or running with the same settings is not queued twice:
+        its existing id is returned, and it is moved up if this submission has higher priority.
+        """
+        rank = PRIORITIES[priority]
+        now = time.time()
+        ids = []
+        with self.lock, self.db:
+            for item in items:
+                item = json.dumps(item, sort_keys=True)
+                row = self.db.execute(
+                    "SELECT id, priority FROM jobs WHERE item = ? AND candidates = ? AND force = ?"
+                    " AND status IN ('queued', 'running')", (item, candidates, int(force))).fetchone()
+                if row is not None:
+                    if rank < row["priority"]:
+                        self.db.execute("UPDATE jobs SET priority = ? WHERE id = ?", (rank, row["id"]))
+                    ids.append(row["id"])
+                    continue
+                cursor = self.db.execute(
+                    "INSERT INTO jobs (feature, item, priority, candidates, force, status, created)"
+                    " VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                    (json.loads(item)["feature"], item, rank, candidates, int(force), now))
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def claim(self, max_priority=None, owner=None):
+        """Mark the next queued job (highest priority, then oldest) running for owner and return it,
+        or None. With max_priority, only jobs at least that urgent are considered. A job another
+        process claims first is skipped, so each job is claimed once."""
+        while True:
+            with self.lock, self.db:
+                row = self.db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' AND priority <= ? ORDER BY priority, id LIMIT 1",
+                    (max(PRIORITIES.values()) if max_priority is None else max_priority,)).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                cursor = self.db.execute(
+                    "UPDATE jobs SET status = 'running', started = ?, owner = ?, heartbeat = ?"
+                    " WHERE id = ? AND status = 'queued'", (now, owner, now, row["id"]))
+            if cursor.rowcount:
+                return self.decode(dict(row, status="running", started=now, owner=owner, heartbeat=now))
+
+    def heartbeat(self, owner):
+        """Show that owner's running jobs are still being worked on."""
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = 'running'",
+                            (time.time(), owner))
+
+    def set_progress(self, job_id, progress):
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET progress = ? WHERE id = ?", (to_json(progress), job_id))
+
+    def add_attempt(self, job_id, attempt):
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET attempts = json_insert(attempts, '$[#]', json(?)) WHERE id = ?",
+                            (to_json(attempt), job_id))
+
+    def update_attempt(self, job_id, index, attempt):
+        """Replace the job's index-th attempt, e.g. once its judge or compiler matrix has answered."""
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET attempts = json_set(attempts, ?, json(?)) WHERE id = ?",
+                            (f"$[{int(index)}]", to_json(attempt), job_id))
+
+    def finish(self, job_id, result):
+        status = "passed" if result["passed"] else "failed"
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET status = ?, result = ?, attempts = ?, finished = ? WHERE id = ?",
+                            (status, to_json(result), to_json(result["attempts"]), time.time(), job_id))
+
+    def fail(self, job_id, error, status="error"):
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                            (status, error, time.time(), job_id))
+
+    def cancel_queued(self, job_id):
+        """Cancel a job that hasn't started. Returns False if it is running or finished."""
+        with self.lock, self.db:
+            cursor = self.db.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                                     (time.time(), job_id))
+        return cursor.rowcount > 0
+
+    def requeue_running(self, owner=None, stale_seconds=STALE_SECONDS):
+        """Running jobs go back in the queue: owner's, or with no owner given, those whose server
+        has sent no heartbeat for stale_seconds (it stopped or died). Returns how many."""
+        if owner is not None:
+            condition, parameters = "owner = ?", (owner,)
+        else:
+            condition, parameters = "(heartbeat IS NULL OR heartbeat < ?)", (time.time() - stale_seconds,)
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "UPDATE jobs SET status = 'queued', started = NULL, progress = NULL, attempts = '[]',"
+                f" owner = NULL, heartbeat = NULL WHERE status = 'running' AND {condition}", parameters)
+        return cursor.rowcount
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self.decode(row) if row else None
+
+    def list(self, status=None, ids=None, limit=100):
+        """Job summaries (no attempts or results), newest first."""
+        conditions, parameters = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            parameters.append(status)
+        if ids is not None:
+            conditions.append(f"id IN ({', '.join('?' * len(ids))})")
+            parameters += list(ids)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            rows = self.db.execute(f"SELECT {SUMMARY_COLUMNS} FROM jobs {where} ORDER BY id DESC LIMIT ?",
+                                   parameters + [limit]).fetchall()
+        return [self.decode(row) for row in rows]
+
+    def counts(self):
+        with self.lock:
+            rows = self.db.execute("SELECT status, COUNT(*) AS jobs FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["jobs"] for row in rows}
+
+    @staticmethod
+    def decode(row):
+        job = dict(row)
+        for name in ("item", "progress", "attempts", "result"):
+            if job.get(name) is not None:
+                job[name] = json.loads(job[name])
+        job["force"] = bool(job["force"])
+        return job
+
+    def close(self):
+        self.db.close()
+
+
+class JobServer:
+    """Runs queued jobs with batch.run_feature on one event loop, and serves the HTTP API.
+
+    Every job shares the spec index, chat clients, sandbox pool and corpus of this process,
+    and the LLM and compile limits of batch.py apply across all of them.
+    """
+
+    def __init__(self, queue=None, corpus=None, spec=None, workers=WORKERS, reserved=RESERVED_WORKERS,
+                 llm_concurrency=None, compile_concurrency=None):
+        self.queue = queue or JobQueue()
+        self.corpus = corpus
+        self.spec = spec  # for items that don't name one; None is spec_index.DEFAULT_SPEC
+        self.workers = workers
+        self.reserved = min(reserved, workers - 1)
+        self.llm_concurrency = llm_concurrency
+        self.compile_concurrency = compile_concurrency
+        self.loop = None
+        self.wakeup = None
+        self.dispatcher = None
+        self.stopping = False
+        self.tasks = {}
+        self.vector_stores = {}
+        self.http = None
+        # Marks this server's jobs in the shared database.
+        self.id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def start(self, port, host="127.0.0.1"):
+        """Start the workers and the API on daemon threads; returns self."""
+        requeued = self.queue.requeue_running()
+        if requeued:
+            print(f"{requeued} orphaned jobs requeued")
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        threading.Thread(target=self.run_loop, args=(started,), daemon=True, name="jobs").start()
+        started.wait()
+        self.http = ThreadingHTTPServer((host, port), make_handler(self))
+        self.http.daemon_threads = True
+        threading.Thread(target=self.http.serve_forever, daemon=True, name="jobs-http").start()
+        return self
+
+    def run_loop(self, started):
+        asyncio.set_event_loop(self.loop)
+        self.wakeup = asyncio.Event()
+        self.dispatcher = self.loop.create_task(self.dispatch())
+        started.set()
+        try:
+            self.loop.run_until_complete(self.dispatcher)
+        except asyncio.CancelledError:
+            # Stopped: running jobs are abandoned as they are and go back in the queue.
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.queue.requeue_running(self.id)
+        self.loop.close()
+
+    def stop(self):
+        if self.http is not None:
+            self.http.shutdown()
+            self.http.server_close()
+        if self.loop is not None:
+            self.stopping = True
+            self.loop.call_soon_threadsafe(self.dispatcher.cancel)
+
+    def wake(self):
+        """Called after a submission, so the dispatcher doesn't wait for its next poll."""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def cancel(self, job_id):
+        if self.queue.cancel_queued(job_id):
+            return True
+        task = self.tasks.get(job_id)
+        if task is None:
+            return False
+        self.loop.call_soon_threadsafe(task.cancel)
+        return True
+
+    async def dispatch(self):
+        from batch import COMPILE_CONCURRENCY, LLM_CONCURRENCY
+
+        self.llm_sem = asyncio.Semaphore(self.llm_concurrency or LLM_CONCURRENCY)
+        self.compile_sem = asyncio.Semaphore(self.compile_concurrency or COMPILE_CONCURRENCY)
+        self.index_lock = asyncio.Lock()
+        running = {}
+        last_heartbeat = time.monotonic()
+        while True:
+            self.wakeup.clear()
+            if time.monotonic() - last_heartbeat >= HEARTBEAT_SECONDS:
+                last_heartbeat = time.monotonic()
+                self.queue.heartbeat(self.id)
+                # Jobs of a server that died without stopping.
+                self.queue.requeue_running()
+            while len(running) < self.workers:
+                bulk = sum(priority > PRIORITIES["interactive"] for priority in running.values())
+                job = self.queue.claim(None if bulk < self.workers - self.reserved else PRIORITIES["interactive"],
+                                       self.id)
+                if job is None:
+                    break
+                task = asyncio.create_task(self.run_job(job))
+                running[task] = job["priority"]
+                self.tasks[job["id"]] = task
+            # Also polls, which picks up jobs queued by another process sharing the database.
+            wakeup = asyncio.create_task(self.wakeup.wait())
+            try:
+                done, _ = await asyncio.wait(set(running) | {wakeup}, timeout=POLL_SECONDS,
+                                             return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                wakeup.cancel()
+            for task in done:
+                running.pop(task, None)
+
+    async def get_vector_store(self, spec):
+        """Retriever for a spec version, opened the first time a job asks for it."""
+        from spec_index import resolve_spec
+        from main import create_vector_store_from_file
+
+        name, spec_path = resolve_spec(spec)
+        async with self.index_lock:
+            if name not in self.vector_stores:
+                self.vector_stores[name] = await asyncio.to_thread(create_vector_store_from_file, spec_path)
+        return self.vector_stores[name]
+
+    async def run_job(self, job):
+        from batch import run_feature
+        from spec_index import DEFAULT_SPEC
+
+        job_id = job["id"]
+        job["item"].setdefault("spec", self.spec or DEFAULT_SPEC)
+        row = {"feature": job["feature"], "status": "starting", "attempt": 0, "exit_code": None, "seconds": 0.0}
+        try:
+            vector_store = await self.get_vector_store(job["item"]["spec"])
+            result = await run_feature(job["item"], vector_store, self.llm_sem, self.compile_sem, row,
+                                       lambda: self.queue.set_progress(job_id, row), job["candidates"],
+                                       self.corpus, job["force"],
+                                       on_attempt=lambda attempt: self.queue.add_attempt(job_id, attempt),
+                                       on_attempt_update=lambda index, attempt: self.queue.update_attempt(
+                                           job_id, index, attempt))
+            self.queue.finish(job_id, result)
+        except asyncio.CancelledError:
+            if not self.stopping:
+                self.queue.fail(job_id, "Cancelled while running.", status="cancelled")
+        except Exception as e:
+            self.queue.fail(job_id, f"{type(e).__name__}: {e}")
+        finally:
+            self.tasks.pop(job_id, None)
+
+
+def make_handler(server):
+    queue = server.queue
+
+    class JobHandler(BaseHTTPRequestHandler):
+        """GET /health, GET /jobs[?status=&ids=1,2&limit=], GET /jobs/<id>, POST /jobs, DELETE /jobs/<id>."""
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, payload, status=200):
+            body = json.dumps(payload, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def job_id(self):
+            parts = urlsplit(self.path).path.strip("/").split("/")
+            if len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+                return int(parts[1])
+            return None
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path.rstrip("/") == "/health":
+                self.send_json({"ok": True, "jobs": queue.counts()})
+            elif url.path.rstrip("/") == "/jobs":
+                query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                ids = [int(i) for i in query["ids"].split(",") if i] if query.get("ids") else None
+                self.send_json(queue.list(query.get("status"), ids, int(query.get("limit", 100))))
+            elif self.job_id() is not None:
+                job = queue.get(self.job_id())
+                self.send_json(job if job else {"error": "no such job"}, 200 if job else 404)
+            else:
+                self.send_json({"error": f"unknown path {self.path}"}, 404)
+
+        def do_POST(self):
+            if urlsplit(self.path).path.rstrip("/") != "/jobs":
+                self.send_json({"error": f"unknown path {self.path}"}, 404)
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                items = request.get("items") or [{"feature": feature, "prompt": feature, "context": None}
+                                                 for feature in request.get("features", [])]
+                if not items or not all(isinstance(item, dict) and item.get("feature") for item in items):
+                    raise ValueError("expected a non-empty 'features' or 'items' list")
+                ids = queue.submit(items, request.get("priority", "bulk"), int(request.get("candidates", 1)),
+                                   bool(request.get("force", False)))
+            except (ValueError, KeyError, TypeError) as e:
+                self.send_json({"error": f"bad request: {e}"}, 400)
+                return
+            server.wake()
+            self.send_json({"ids": ids})
+
+        def do_DELETE(self):
+            if self.job_id() is None:
+                self.send_json({"error": f"unknown path {self.path}"}, 404)
+                return
+            cancelled = server.cancel(self.job_id())
+            self.send_json({"cancelled": cancelled}, 200 if cancelled else 409)
+
+    return JobHandler
+
+
+class JobClient:
+    """The HTTP API from Python: what the Streamlit page and the CLI below use."""
+
+    def __init__(self, url=JOB_SERVER_URL, timeout=10):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def call(self, method, path, **kwargs):
+        response = self.session.request(method, self.url + path, timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def healthy(self):
+        try:
+            return self.session.get(self.url + "/health", timeout=1).ok
+        except requests.RequestException:
+            return False
+
+    def submit(self, items, priority="bulk", candidates=1, force=False):
+        return self.call("POST", "/jobs", json={"items": items, "priority": priority, "candidates": candidates,
+                                               "force": force})["ids"]
+
+    def job(self, job_id):
+        return self.call("GET", f"/jobs/{job_id}")
+
+    def jobs(self, status=None, ids=None, limit=100):
+        params = {"limit": limit}
+        if status:
+            params["status"] = status
+        if ids is not None:
+            params["ids"] = ",".join(str(i) for i in ids)
+            params["limit"] = max(limit, len(ids))
+        return self.call("GET", "/jobs", params=params)
+
+    def cancel(self, job_id):
+        response = self.session.delete(f"{self.url}/jobs/{job_id}", timeout=self.timeout)
+        return response.ok
+
+    def wait(self, ids, on_update=None, poll=POLL_SECONDS):
+        """Poll until every job has finished; on_update(summaries) is called after each poll."""
+        while True:
+            summaries = self.jobs(ids=ids)
+            if on_update:
+                on_update(summaries)
+            if all(job["status"] in FINISHED for job in summaries):
+                return summaries
+            time.sleep(poll)
+
+
+def start_server(url=JOB_SERVER_URL, **kwargs):
+    """Run a JobServer in this process on url's port."""
+    parts = urlsplit(url)
+    return JobServer(**kwargs).start(parts.port, parts.hostname)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local job service for test generation.")
+    parser.add_argument("--url", default=JOB_SERVER_URL)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve = subparsers.add_parser("serve", help="Run the workers and the HTTP API.")
+    serve.add_argument("--spec", help="Spec version for jobs that don't name one.")
+    serve.add_argument("--jobs", default=JOBS_PATH, help="Queue database.")
+    serve.add_argument("--workers", type=int, default=WORKERS)
+    serve.add_argument("--reserved", type=int, default=RESERVED_WORKERS, help="Workers kept for interactive jobs.")
+    serve.add_argument("--no-corpus", action="store_true", help="Don't read or record the test corpus.")
+    submit = subparsers.add_parser("submit", help="Queue a feature, or every feature in a file.")
+    submit.add_argument("features", help="A text file with one feature per line, a .jl prompt file, or a feature.")
+    submit.add_argument("--priority", choices=list(PRIORITIES), default="bulk")
+    submit.add_argument("--spec", help="Spec version; default the server's.")
+    submit.add_argument("--candidates", type=int, default=1)
+    submit.add_argument("--force", action="store_true", help="Regenerate features that already have a passing test.")
+    submit.add_argument("--wait", action="store_true", help="Follow the jobs until they finish.")
+    submit.add_argument("--out", help="With --wait, write the results here as JSON lines.")
+    status = subparsers.add_parser("status", help="One job, with its attempts and result.")
+    status.add_argument("id", type=int)
+    listing = subparsers.add_parser("list", help="Recent jobs.")
+    listing.add_argument("--status", choices=ACTIVE + FINISHED)
+    listing.add_argument("--limit", type=int, default=20)
+    cancel = subparsers.add_parser("cancel", help="Cancel a queued or running job.")
+    cancel.add_argument("id", type=int)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        from corpus import Corpus
+        parts = urlsplit(args.url)
+        JobServer(JobQueue(args.jobs), None if args.no_corpus else Corpus(), args.spec, args.workers,
+                  args.reserved).start(parts.port, parts.hostname)
+        print(f"serving jobs at {args.url}, Ctrl-C to stop")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            return
+
+    client = JobClient(args.url)
+    if args.command == "submit":
+        if os.path.exists(args.features):
+            from batch import load_features
+            items = load_features(args.features)
+        else:
+            items = [{"feature": args.features, "prompt": args.features, "context": None}]
+        if args.spec:
+            for item in items:
+                item["spec"] = args.spec
+        ids = client.submit(items, args.priority, args.candidates, args.force)
+        print(f"queued {len(ids)} jobs: {', '.join(str(i) for i in ids)}")
+        if args.wait:
+            seen = {}
+
+            def show(summaries):
+                for job in summaries:
+                    line = job["status"] if job["status"] != "running" else (job["progress"] or {}).get("status")
+                    if seen.get(job["id"]) != line:
+                        seen[job["id"]] = line
+                        print(f"job {job['id']} {job['feature']}: {line}", flush=True)
+
+            summaries = client.wait(ids, show)
+            passed = sum(job["status"] == "passed" for job in summaries)
+            print(f"{passed}/{len(summaries)} features passed")
+            if args.out:
+                with open(args.out, 'w', encoding='utf-8') as file:
+                    for job_id in ids:
+                        job = client.job(job_id)
+                        file.write(json.dumps(job["result"] or {"feature": job["feature"], "error": job["error"],
+                                                                 "attempts": [], "passed": False}) + "\n")
+    elif args.command == "status":
+        print(json.dumps(client.job(args.id), indent=2))
+    elif args.command == "list":
+        for job in client.jobs(args.status, limit=args.limit):
+            progress = job["progress"] or {}
+            print(f"{job['id']:>6} {job['status']:<10} attempt {progress.get('attempt', 0)} {job['feature']}")
+    else:
+        print("cancelled" if client.cancel(args.id) else "not cancelled (unknown or already finished)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import math
+import re
+from collections import Counter
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """Lowercased word tokens. Identifiers like num_gangs are kept whole and also split,
+    so "num_gangs" and "num gangs" both match."""
+    tokens = []
+    for token in re.findall(r'[a-z0-9_]+', text.lower()):
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part)
+    return tokens
+
+
+class BM25Index:
+    """Inverted index over a fixed list of chunks, scored with Okapi BM25."""
+
+    def __init__(self, postings, doc_lengths, k1=BM25_K1, b=BM25_B):
+        self.postings = postings  # term -> [[doc_id, term_frequency], ...]
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+        n = len(doc_lengths)
+        self.idf = {term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for term, docs in postings.items()}
+
+    @classmethod
+    def build(cls, chunks, k1=BM25_K1, b=BM25_B):
+        postings = {}
+        doc_lengths = []
+        for doc_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append([doc_id, tf])
+        return cls(postings, doc_lengths, k1, b)
+
+    def to_dict(self):
+        return {"postings": self.postings, "doc_lengths": self.doc_lengths, "k1": self.k1, "b": self.b}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["postings"], data["doc_lengths"], data["k1"], data["b"])
+
+    def search(self, query, k=3):
+        """Return [(doc_id, score)] for the k best chunks, best first."""
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
@@ -1,157 +1,492 @@
 import streamlit as st
-from langchain_community.vectorstores import FAISS
-from langchain_nvidia_ai_endpoints import ChatNVIDIA, NVIDIAEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-import torch
+import datetime
+import functools
+import json
 import os
-import subprocess
+import tempfile
+import time
+from spec_index import DEFAULT_SPEC, SECTIONS_FILE, available_specs, load_retriever, resolve_spec, shard_root
+from spec_normalize import hash_file
+from sandbox import LAUNCH_ERROR, get_default_pool
+from fences import LANGUAGE_TAGS, extract_code, fence_closed
+from spec_sections import SectionRetriever, load_section_index
+from prompt_budget import Section, assemble, get_token_counter
+from diagnostics import compact_feedback, diagnostics_table
+from http_clients import pooled, streaming
+from corpus import Corpus, CorpusKey, digest
+from tracing import configure as configure_tracing, record_sandbox, serve_metrics, spans_to_jsonl
+from jobs import FINISHED, JobClient, start_server
+from matrix import GRID_COLUMNS, summary as matrix_summary
+from precheck import REJECTED, precheck
 
 EMBED_URL = "http://localhost:8081/v1"
 EMBEDDING_MODEL = "NV-Embed-QA"
 MODEL = "mistral-nemo-12b-instruct"
 CHAT_URL = "http://localhost:8000/v1/chat/completions"
 MAX_RETRIES = 3
+# Requests in flight to the chat NIM, across sessions, batch runs and judges (see http_clients.py).
+CHAT_CONCURRENCY = 16
+INDEX_DIR = "index"
+# "vector", "hybrid" (BM25 + vector) or "lexical" (BM25 only, no embedding service).
+RETRIEVAL_MODE = "hybrid"
+# "all": judge every attempt, "skip_compile_failures": don't judge attempts that
+# failed to compile, "final": judge only the attempt the run ends on.
+JUDGE_POLICY = "all"
+# Which attempts are also built and run in every compiler/flag cell of matrix.py:
+# "final" only the attempt the run ends on, "all" every attempt, "off" none. Attempts that
+# were rejected or failed to compile are never matrixed. Only the default sandbox compile
+# decides whether an attempt passed.
+MATRIX_POLICY = "final"
+# Tests sampled concurrently per attempt; the first to pass wins. 1 = one test per attempt.
+CANDIDATES = 1
+MAX_CANDIDATES = 8
+COMPILE_FAILURES = {"compile_error", "compile_timeout", LAUNCH_ERROR, REJECTED}
+# Before the full build and run, turn away tests with an obvious problem (no code, no main(),
+# no OpenACC; with PRECHECK_FEATURE, not using the directives, clauses or routines the feature
+# names) and, with PRECHECK_SYNTAX, tests that fail a syntax-only compile. See precheck.py.
+PRECHECK = True
+PRECHECK_FEATURE = True
+PRECHECK_SYNTAX = True
+# Token budgets for prompt sections (see prompt_budget.py).
+PROMPT_TOKENS = 6000
+JUDGE_PROMPT_TOKENS = 4000
+CONTEXT_TOKENS = 3000
+PREVIOUS_CODE_TOKENS = 1500
+DIAGNOSTIC_TOKENS = 1000
+# Per-stage timing spans (see tracing.py). TRACE_FILE appends every span as a JSON line;
+# METRICS_PORT serves Prometheus text at http://localhost:<port>/metrics.
+TRACING = True
+TRACE_FILE = None
+METRICS_PORT = None
+# Runs are done by the job server (jobs.py); the pages submit jobs and poll them. If nothing
+# answers at JOB_SERVER_URL, the first session starts one inside this process.
+JOB_SERVER_URL = "http://127.0.0.1:8765"
+POLL_SECONDS = 0.5
+
+tracer = configure_tracing(TRACING, TRACE_FILE)
+
+# langchain and the NVIDIA clients are imported inside the functions that first need
+# them (here and in spec_index.py), so the page renders before they load. bench/startup.py
+# measures it.
 
 def load_spec_file(file_path):
     with open(file_path, 'r', encoding='utf-8') as file:
         content = file.read()
     return content
 
-def create_vector_store_from_file(file_path):
-    content = load_spec_file(file_path)
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    documents = text_splitter.split_text(content)
-    doc_objects = [Document(page_content=doc) for doc in documents]
-    embeddings = NVIDIAEmbeddings(base_url=EMBED_URL, model=EMBEDDING_MODEL)
-    return FAISS.from_documents(doc_objects, embeddings)
-
-def retrieve_context(vector_store, query):
-    return vector_store.similarity_search(query, k=3)
+def create_vector_store_from_file(file_path, mode=None):
+    # Opens the spec's shard in INDEX_DIR; only splits or embeds when the spec,
+    # splitter settings or embedding model changed (see spec_index.py).
+    return load_retriever(file_path, mode or RETRIEVAL_MODE, INDEX_DIR, embedding_model=EMBEDDING_MODEL, embed_url=EMBED_URL)
 
-def generate_test_with_context(prompt, context, previous_code=None, previous_output=None):
-    model = ChatNVIDIA(
+# lru_cache rather than st.cache_resource: the job server calls these from its own threads,
+# outside any Streamlit session.
+@functools.lru_cache(maxsize=None)
+def get_chat_model(temperature, max_tokens):
+    # One client per (temperature, max_tokens) for the whole process, shared by all sessions,
+    # and all of them on one keep-alive connection pool to CHAT_URL.
+    from langchain_nvidia_ai_endpoints import ChatNVIDIA
+    return pooled(ChatNVIDIA(
         model=MODEL,
         base_url=CHAT_URL,
-        temperature=0.7,
-        max_tokens=1000,
-    )
-    
-    full_prompt = (
-        f"Use the following context from the specification to create an OpenACC compiler validation test in C. "
-        f"Return 0 if the feature works, 1 otherwise.\n\n"
-        f"Context:\n{context}\n\n"
-        f"Feature: {prompt}\n\n"
-    )
-    
-    if previous_code:
-        full_prompt += f"Previous Code Attempt:\n{previous_code}\n\n"
-    
-    if previous_output:
-        full_prompt += f"Previous Compiler Output:\n{previous_output}\n\n"
-
-    full_prompt += "```"
-
-    response = model.invoke(full_prompt)
-    code_snippet = response.content.split('```')[1] if '```' in response.content else ""
-    return code_snippet.strip()
-
-def compile_and_run_test(test_code):
-    test_file_path = "parsedTest.c"
-    with open(test_file_path, 'w', encoding='utf-8') as file:
-        file.write(test_code)
-
-    base_name = os.path.splitext(os.path.basename(test_file_path))[0]
-    build_path = os.path.join('build', base_name)
-
-    compile_command = f"nvc -acc -Minfo=all -o {build_path} {test_file_path}"
-    
-    os.makedirs('build', exist_ok=True)
-    
-    compile_result = subprocess.run(compile_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-    compile_output = compile_result.stderr.strip() if compile_result.stderr else compile_result.stdout.strip()
-    
-    if compile_result.returncode != 0:
-        return compile_result.returncode, compile_output, ""
-
-    run_command = f"./{build_path}"
-    run_result = subprocess.run(run_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-    
-    run_output = run_result.stdout.strip() if run_result.stdout else run_result.stderr.strip()
-    
-    return run_result.returncode, compile_output, run_output
-
-def evaluate_test_with_llmj(feature_prompt, context_texts, generated_code, compiler_output, runtime_output):
-    llmj_prompt = (
-        f"Evaluate the following test for the feature '{feature_prompt}'.\n\n"
-        f"Context:\n{context_texts}\n\n"
-        f"Generated Code:\n{generated_code}\n\n"
-        f"Compiler Output:\n{compiler_output}\n\n"
-        f"Runtime Output:\n{runtime_output}\n\n"
-        f"Is this a good test? Provide a one-sentence evaluation."
-    )
-    
-    model = ChatNVIDIA(
-        model=MODEL,
-        base_url=CHAT_URL,
-        temperature=0.5,
-        max_tokens=100,
-    )
-    
-    response = model.invoke(llmj_prompt)
-    
+        temperature=temperature,
+        max_tokens=max_tokens,
+    ), CHAT_CONCURRENCY)
+
+@st.cache_resource
+def get_metrics_server():
+    return serve_metrics(tracer, METRICS_PORT) if TRACING and METRICS_PORT else None
+
+@st.cache_resource
+def get_corpus():
+    return Corpus()
+
+@st.cache_resource(show_spinner="Starting the job server...")
+def get_job_client():
+    # One client per process; every session submits to the same server and its warm resources.
+    client = JobClient(JOB_SERVER_URL)
+    if not client.healthy():
+        start_server(JOB_SERVER_URL, corpus=get_corpus())
+    return client
+
+@functools.lru_cache(maxsize=8)
+def _spec_hash(spec_path, mtime):
+    return hash_file(spec_path)
+
+def spec_version(spec_path="spec.txt"):
+    return _spec_hash(spec_path, os.path.getmtime(spec_path))
+
+def corpus_key(feature, prompt=None, spec_path="spec.txt"):
+    """What a stored test for this feature must match to be reused: the spec, the model, and
+    the generation prompt as built without retrieved context (so prompt template, feature text
+    and retrieval mode changes all invalidate it)."""
+    template = build_generation_prompt(prompt or feature, "")
+    return CorpusKey(feature, spec_version(spec_path), MODEL, digest(f"{RETRIEVAL_MODE}\n{template}"))
+
+@functools.lru_cache(maxsize=None)
+def get_section_retriever(file_path="spec.txt"):
+    # Section lookups follow the OpenACC 3.3 table of contents; for other specs only the
+    # headings that match resolve, and everything else goes to the shard.
+    return SectionRetriever(load_section_index(file_path, os.path.join(shard_root(file_path, INDEX_DIR), SECTIONS_FILE)))
+
+async def aretrieve_context(vector_store, query):
+    with tracer.span("retrieve") as span:
+        section = get_section_retriever(vector_store.spec_path).lookup(query)
+        span.set(source="section" if section is not None else "index")
+        if section is not None:
+            from langchain_core.documents import Document
+            return [Document(page_content=section["text"])]
+        return await vector_store.asimilarity_search(query, k=3)
+
+def build_generation_prompt(prompt, context, previous_code=None, previous_output=None):
+    # Each section has a token budget; the instruction, feature and fence are never cut.
+    sections = [
+        Section("instruction",
+                "Use the following context from the specification to create an OpenACC compiler validation test in C. "
+                "Return 0 if the feature works, 1 otherwise.\n\n", required=True),
+        Section("context", context, header="Context:\n", footer="\n\n", budget=CONTEXT_TOKENS, priority=1),
+        Section("feature", f"Feature: {prompt}\n\n", required=True),
+        Section("previous_code", previous_code or "", header="Previous Code Attempt:\n", footer="\n\n",
+                budget=PREVIOUS_CODE_TOKENS, priority=0),
+        Section("diagnostics", previous_output or "", header="Previous Attempt Diagnostics:\n", footer="\n\n",
+                budget=DIAGNOSTIC_TOKENS, priority=2),
+        Section("fence", "```", required=True),
+    ]
+    full_prompt, _ = assemble(sections, PROMPT_TOKENS)
+    return full_prompt
+
+def clean_generated_code(generated_code):
+    # extract_code() leaves the fence's language tag ("c", "cpp", ...) on the first line.
+    first_line, _, rest = generated_code.partition("\n")
+    if first_line.strip().lower() in LANGUAGE_TAGS:
+        return rest
+    return generated_code
+
+async def agenerate_test_with_context(prompt, context, previous_code=None, previous_output=None, on_token=None):
+    model = get_chat_model(0.7, 1000)
+    content = ""
+    full_prompt = build_generation_prompt(prompt, context, previous_code, previous_output)
+    with tracer.span("generate") as span, streaming():
+        stream = model.astream(full_prompt)
+        chunks = 0
+        try:
+            async for chunk in stream:
+                if not chunks:
+                    span.set(first_token_seconds=round(span.elapsed(), 3))
+                chunks += 1
+                content += chunk.content
+                if on_token:
+                    on_token(content)
+                if fence_closed(content):
+                    break
+        finally:
+            await stream.aclose()
+        if span.recording:
+            span.set(prompt_tokens=get_token_counter()(full_prompt), completion_tokens=chunks)
+    return extract_code(content)
+
+def compile_and_run_sandboxed(test_code, feature=None):
+    # Each call gets its own temp directory and process limits, so concurrent
+    # sessions and batch jobs can't clobber each other (see sandbox.py).
+    pool = get_default_pool()
+    if PRECHECK:
+        rejected = precheck(test_code, feature if PRECHECK_FEATURE else None, ".c", pool, PRECHECK_SYNTAX, tracer)
+        if rejected is not None:
+            return rejected
+    result = pool.run(test_code, ".c")
+    record_sandbox(result, tracer)
+    return result
+
+def build_judge_prompt(feature_prompt, context_texts, generated_code, compiler_output, runtime_output):
+    sections = [
+        Section("instruction", f"Evaluate the following test for the feature '{feature_prompt}'.\n\n", required=True),
+        Section("context", context_texts, header="Context:\n", footer="\n\n", budget=CONTEXT_TOKENS, priority=0),
+        Section("code", generated_code, header="Generated Code:\n", footer="\n\n", budget=PREVIOUS_CODE_TOKENS, priority=3),
+        Section("diagnostics", compiler_output, header="Compiler Output:\n", footer="\n\n", budget=DIAGNOSTIC_TOKENS, priority=2),
+        Section("runtime", runtime_output, header="Runtime Output:\n", footer="\n\n", budget=DIAGNOSTIC_TOKENS,
+                priority=1, keep="tail"),
+        Section("question", "Is this a good test? Provide a one-sentence evaluation.", required=True),
+    ]
+    llmj_prompt, _ = assemble(sections, JUDGE_PROMPT_TOKENS)
+    return llmj_prompt
+
+def judge_token_counts(llmj_prompt, response):
+    # Prefer the server's usage numbers; count locally if it didn't send any.
+    usage = response.response_metadata.get("token_usage") or {}
+    count_tokens = get_token_counter()
+    return {
+        "prompt_tokens": usage.get("prompt_tokens") or count_tokens(llmj_prompt),
+        "completion_tokens": usage.get("completion_tokens") or count_tokens(response.content),
+    }
+
+async def aevaluate_test_with_llmj(feature_prompt, context_texts, generated_code, compiler_output, runtime_output):
+    model = get_chat_model(0.5, 100)
+    llmj_prompt = build_judge_prompt(feature_prompt, context_texts, generated_code, compiler_output, runtime_output)
+    with tracer.span("judge") as span:
+        response = await model.ainvoke(llmj_prompt)
+        if span.recording:
+            span.set(**judge_token_counts(llmj_prompt, response))
     return response.content.strip()
 
-def main():
-    st.title("LLM4VV")
-    
-    vector_store = create_vector_store_from_file("spec.txt")
+def should_judge(attempt, final, policy=None):
+    # None means JUDGE_POLICY as it is now, so changing it at runtime takes effect.
+    policy = policy or JUDGE_POLICY
+    if policy == "final":
+        return final
+    if policy == "skip_compile_failures":
+        return attempt["status"] not in COMPILE_FAILURES
+    return True
 
-    feature_prompt = st.text_input("Enter an OpenACC feature to test:")
+def should_run_matrix(attempt, final, policy=None):
+    policy = policy or MATRIX_POLICY
+    if policy == "off" or attempt["status"] in COMPILE_FAILURES:
+        return False
+    return final or policy == "all"
 
-    if feature_prompt:
-        retrieved_docs = retrieve_context(vector_store, feature_prompt)
-        context_texts = "\n".join([doc.page_content for doc in retrieved_docs])
+def render_matrix(grid):
+    with st.expander(f"Compiler Matrix: {matrix_summary(grid)}", expanded=False):
+        st.dataframe(grid, column_order=GRID_COLUMNS)
+
+def make_attempt(generated_code, feature=None):
+    """Compile and run a generated test; the attempt record the pages and retries work from."""
+    result = compile_and_run_sandboxed(generated_code, feature)
+
+    attempt = {
+        "code": generated_code,
+        "status": result.status,
+        "exit_code": result.exit_code,
+        "compiler_output": result.compile_output,
+        "runtime_output": result.run_output,
+        "evaluation": None,
+    }
+    attempt["feedback"] = attempt_feedback(attempt)
+    return attempt
+
+def attempt_feedback(attempt):
+    """Errors/warnings with their source lines and the exit status, for the retry prompt. A
+    precheck rejection is already a short list of problems and goes back as it is."""
+    if attempt["status"] == REJECTED:
+        return attempt["compiler_output"]
+    return compact_feedback(attempt["compiler_output"], attempt["code"], attempt["exit_code"],
+                            attempt["runtime_output"], compiled=attempt["status"] not in COMPILE_FAILURES)
+
+def best_failure(attempts):
+    # A test that compiled and then failed is closer to passing than one that didn't
+    # compile, and gives the retry runtime output to work with.
+    return min(attempts, key=lambda attempt: attempt["status"] in COMPILE_FAILURES)
+
+def render_attempt(retry, attempt, judging=False):
+    """Render an attempt; judging means its job is still running, so a missing verdict may yet come."""
+    st.write(f"Attempt {retry + 1} to generate and run test...")
+    if attempt.get("candidates"):
+        passed = sum(candidate["exit_code"] == 0 for candidate in attempt["candidates"])
+        st.caption(f"{len(attempt['candidates'])} candidates finished, {passed} passed: "
+                   + ", ".join(candidate["status"] for candidate in attempt["candidates"]))
+
+    with st.expander("Generated Test", expanded=False):
+        st.code(attempt["code"], language='c')
+
+    with st.expander("Compiler Output", expanded=False):
+        rows = diagnostics_table(attempt["compiler_output"], attempt["code"])
+        if rows:
+            st.dataframe(rows, column_order=["severity", "line", "message", "source"])
+        st.text(attempt["compiler_output"])
+
+    with st.expander("Runtime Output", expanded=False):
+        st.text(attempt["runtime_output"])
+
+    with st.expander("LLM Evaluation", expanded=False):
+        if attempt.get("evaluation") is not None:
+            st.text(attempt["evaluation"])
+        elif judging:
+            st.text("Evaluating...")
+        else:
+            st.text("Not evaluated (judge policy).")
+
+    if attempt.get("matrix"):
+        render_matrix(attempt["matrix"])
+
+    if attempt["exit_code"] == 0:
+        st.success("Test passed.")
+    else:
+        st.error("Test failed.")
+        if retry < MAX_RETRIES:
+            st.info("Retrying with additional context based on previous outputs...")
 
-        with st.expander("Retrieved Context from Spec", expanded=False):
-            st.text(context_texts)
+def job_status_text(job):
+    if job["status"] == "queued":
+        return "Queued..."
+    progress = job["progress"] or {}
+    return f"Attempt {progress.get('attempt') or 1}: {progress.get('status', 'starting')}..."
 
-        previous_code = None
-        previous_output = None
+def follow_job(client, job_id):
+    """Render a job's attempts as they finish, polling until it is done. The job runs in the
+    job server, so leaving the page doesn't stop it, and the next script run picks it up again."""
+    view = st.empty()
+    shown = None
+    while True:
+        job = client.job(job_id)
+        finished = job["status"] in FINISHED
+        state = (job["status"], len(job["attempts"]), json.dumps(job["progress"]))
+        if state != shown:
+            shown = state
+            with view.container():
+                if finished and job["result"] and job["result"].get("context"):
+                    with st.expander("Retrieved Context from Spec", expanded=False):
+                        st.text(job["result"]["context"])
+                for retry, attempt in enumerate(job["attempts"]):
+                    render_attempt(retry, attempt, judging=not finished)
+                partial = (job["progress"] or {}).get("partial")
+                if not finished and partial:
+                    # The attempt being generated, as far as the model has got.
+                    st.write(f"Attempt {len(job['attempts']) + 1} to generate and run test...")
+                    with st.expander("Generated Test", expanded=True):
+                        st.code(partial, language='c')
+                if not finished:
+                    st.info(job_status_text(job))
+        if finished:
+            return job
+        time.sleep(POLL_SECONDS)
 
-        for retry in range(MAX_RETRIES + 1):
-            st.write(f"Attempt {retry + 1} to generate and run test...")
-            generated_code = generate_test_with_context(feature_prompt, context_texts, previous_code, previous_output)
+def render_cached(stored):
+    created = datetime.datetime.fromtimestamp(stored["created"]).strftime("%Y-%m-%d %H:%M")
+    st.success(f"Passing test from the corpus, generated {created} (attempt {stored['retry'] + 1}). "
+               "Press Regenerate for a new one.")
+    st.code(stored["code"], language='c')
+    with st.expander("Compiler Output", expanded=False):
+        st.text(stored["compiler_output"])
+    with st.expander("Runtime Output", expanded=False):
+        st.text(stored["runtime_output"])
+    with st.expander("LLM Evaluation", expanded=False):
+        st.text(stored["evaluation"] or "Not evaluated.")
+    if stored.get("matrix"):
+        render_matrix(stored["matrix"])
 
-            if generated_code.startswith("c\n"):
-                generated_code = generated_code[2:]
+def render_timings(timings):
+    """Collapsible per-stage breakdown of a run, with a JSON lines download."""
+    with st.expander("Timings", expanded=False):
+        if not timings:
+            st.text("Tracing is off." if not tracer.enabled else "Nothing timed yet.")
+            return
+        totals = {}
+        for span in timings:
+            totals[span["stage"]] = totals.get(span["stage"], 0.0) + span["seconds"]
+        st.write(", ".join(f"{stage}: {seconds:.2f}s" for stage, seconds in totals.items()))
+        st.dataframe(timings, column_order=["retry", "stage", "seconds", "first_token_seconds", "prompt_tokens",
+                                            "completion_tokens", "cache_hit", "source", "status"])
+        st.download_button("Download as JSON lines", spans_to_jsonl(timings), file_name="timings.jsonl")
 
-            with st.expander("Generated Test", expanded=False):
-                st.code(generated_code, language='c')
+def batch_row(job):
+    """A job summary as a row of batch.py's progress table."""
+    progress = job["progress"] or {}
+    status = progress.get("status") if job["status"] in ("running", "passed", "failed") and progress else job["status"]
+    return {"feature": job["feature"], "status": status, "attempt": progress.get("attempt", 0),
+            "exit_code": progress.get("exit_code"), "seconds": progress.get("seconds", 0.0)}
 
-            exit_code, compiler_output, runtime_output = compile_and_run_test(generated_code)
+def batch_page(spec=DEFAULT_SPEC, candidates=CANDIDATES):
+    # Imported here because batch.py imports from this module.
+    from batch import TABLE_COLUMNS, load_features, only_gaps, parse_features
 
-            with st.expander("Compiler Output", expanded=False):
-                st.text(compiler_output)
-            
-            with st.expander("Runtime Output", expanded=False):
-                st.text(runtime_output)
+    features_text = st.text_area("OpenACC features to test, one per line:")
+    uploaded = st.file_uploader("...or a prompt file", type=["txt", "jl"])
+    gaps = st.checkbox("Only features without a passing test")
+    force = st.checkbox("Regenerate features that already have a passing test")
 
-            evaluation_result = evaluate_test_with_llmj(feature_prompt, context_texts, generated_code, compiler_output, runtime_output)
-            
-            with st.expander("LLM Evaluation", expanded=False):
-                st.text(evaluation_result)
+    if st.button("Run batch"):
+        if uploaded is not None:
+            with tempfile.NamedTemporaryFile("wb", suffix=os.path.splitext(uploaded.name)[1], delete=False) as tmp:
+                tmp.write(uploaded.getvalue())
+            items = load_features(tmp.name)
+            os.remove(tmp.name)
+        else:
+            items = parse_features(features_text)
+        for item in items:
+            item["spec"] = spec
+        if gaps:
+            items = only_gaps(items, get_corpus(), resolve_spec(spec)[1])
+        # Bulk priority: single-feature requests from any session go ahead of these.
+        st.session_state["batch_jobs"] = get_job_client().submit(items, "bulk", candidates, force) if items else []
 
-            if exit_code == 0:
-                st.success("Test passed.")
-                break
+    job_ids = st.session_state.get("batch_jobs")
+    if job_ids:
+        client = get_job_client()
+        table = st.empty()
+        summaries = client.wait(job_ids, on_update=lambda jobs: table.dataframe(
+            [batch_row(job) for job in sorted(jobs, key=lambda job: job["id"])], column_order=TABLE_COLUMNS),
+            poll=POLL_SECONDS)
+        failed = {job["id"]: job for job in summaries if job["status"] in ("error", "cancelled")}
+        results = []
+        for job_id in job_ids:
+            if job_id in failed:
+                results.append({"feature": failed[job_id]["feature"], "error": failed[job_id]["error"] or "Cancelled.",
+                                "attempts": [], "passed": False})
             else:
-                st.error("Test failed.")
-                if retry < MAX_RETRIES:
-                    st.info("Retrying with additional context based on previous outputs...")
+                results.append(client.job(job_id)["result"])
+
+        passed = sum(result["passed"] for result in results)
+        st.write(f"{passed}/{len(results)} features passed.")
+        for result in results:
+            label = "STORED" if result.get("stored") else "PASS" if result["passed"] else "FAIL"
+            with st.expander(f"{label}: {result['feature']}", expanded=False):
+                if result.get("error"):
+                    st.error(result["error"])
+                for retry, attempt in enumerate(result["attempts"]):
+                    st.write(f"Attempt {retry + 1}: exit code {attempt['exit_code']}"
+                             + (f", {matrix_summary(attempt['matrix'])}" if attempt.get("matrix") else ""))
+                    st.code(attempt["code"], language='c')
+
+def feature_page(spec=DEFAULT_SPEC, candidates=CANDIDATES):
+    feature_prompt = st.text_input("Enter an OpenACC feature to test:")
+
+    if feature_prompt:
+        key = corpus_key(feature_prompt, spec_path=resolve_spec(spec)[1])
+        jobs = st.session_state.setdefault("jobs", {})
+        regenerate = st.button("Regenerate")
+        if regenerate:
+            jobs.pop((spec, feature_prompt), None)
+
+        # A passing test for the same spec, model and prompt is served without any LLM calls.
+        if (spec, feature_prompt) not in jobs and not regenerate:
+            stored = get_corpus().passing_test(key)
+            if stored is not None:
+                render_cached(stored)
+                return
+
+        # Interactive priority, so this runs ahead of any queued batch. A job for the same
+        # feature that is still running (e.g. from before a reconnect) is picked up, not repeated.
+        client = get_job_client()
+        if (spec, feature_prompt) not in jobs:
+            item = {"feature": feature_prompt, "prompt": feature_prompt, "context": None, "spec": spec}
+            jobs[spec, feature_prompt] = client.submit([item], "interactive", candidates, force=regenerate)[0]
+
+        job = follow_job(client, jobs[spec, feature_prompt])
+        if job["error"]:
+            st.error(job["error"])
+        render_timings((job["result"] or {}).get("timings", []))
+
+def main():
+    st.title("LLM4VV")
+    # The spec index is loaded by the job server's first run, not here.
+    get_metrics_server()
 
-            previous_code = generated_code
-            previous_output = compiler_output
+    mode = st.sidebar.radio("Mode", ["Single feature", "Batch"])
+    specs = list(available_specs())
+    spec = st.sidebar.selectbox("Spec version", specs, index=specs.index(DEFAULT_SPEC),
+                                help="Add a version by putting its text in specs/<name>.txt.")
+    candidates = int(st.sidebar.number_input("Candidates per attempt", min_value=1, max_value=MAX_CANDIDATES,
+                                             value=CANDIDATES, help="Tests sampled in parallel; the first to pass wins."))
+    cache_status = st.sidebar.empty()
+    try:
+        if mode == "Batch":
+            batch_page(spec, candidates)
+        else:
+            feature_page(spec, candidates)
+    finally:
+        stats = get_default_pool().cache_stats()
+        corpus_stats = get_corpus().stats()
+        cache_status.caption(f"Compile cache: {stats['hits']} hits, {stats['misses']} misses. "
+                             f"Corpus: {corpus_stats['tests']} tests, "
+                             f"{corpus_stats['passing_features']}/{corpus_stats['features']} features passing")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
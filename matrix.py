@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import shutil
+from collections import namedtuple
+
+from diagnostics import parse_diagnostics
+from sandbox import COMPILERS, SandboxResult, get_default_pool
+from tracing import get_tracer
+
+# One build configuration: the compiler for each source suffix, and the flags for all of them.
+Cell = namedtuple("Cell", ["name", "compilers", "flags"])
+
+GNU = {".c": "gcc", ".cpp": "g++", ".f90": "gfortran"}
+LLVM = {".c": "clang", ".cpp": "clang++", ".f90": "flang"}
+
+# Every test is built and run in each cell. gcc and clang are local stand-ins for machines
+# without the NVIDIA HPC SDK; a cell whose compiler isn't installed is reported, not run.
+MATRIX = [
+    Cell("nvc gpu", COMPILERS, ["-acc=gpu", "-Minfo=accel"]),
+    Cell("nvc multicore", COMPILERS, ["-acc=multicore", "-Minfo=accel"]),
+    Cell("gcc", GNU, ["-fopenacc"]),
+    Cell("clang", LLVM, ["-fopenacc"]),
+]
+UNAVAILABLE = "unavailable"
+GRID_COLUMNS = ["cell", "status", "exit_code", "compile_seconds", "run_seconds", "errors", "warnings", "diagnostic"]
+
+
+def cell_row(cell, suffix, future, source):
+    """One grid row: how the test did in this cell, with timings and its first diagnostic."""
+    compiler = cell.compilers.get(suffix)
+    row = {"cell": cell.name, "compiler": compiler, "flags": " ".join(cell.flags)}
+    if future is None:
+        missing = f"{compiler} is not installed" if compiler else f"no {suffix} compiler"
+        return dict(row, status=UNAVAILABLE, exit_code=None, compile_seconds=0.0, run_seconds=0.0, cached=False,
+                    errors=0, warnings=0, diagnostic=missing, compile_output="", run_output="")
+    try:
+        result = future.result()
+    except Exception as e:
+        result = SandboxResult("error", 1, f"An error occurred: {e}")
+
+    diagnostics = parse_diagnostics(result.compile_output, source)
+    errors = [diagnostic for diagnostic in diagnostics if diagnostic.severity == "error"]
+    warnings = [diagnostic for diagnostic in diagnostics if diagnostic.severity == "warning"]
+    if errors:
+        first = f"line {errors[0].line}: {errors[0].message}" if errors[0].line else errors[0].message
+    elif result.status in ("compile_error", "compile_timeout", "launch_error", "error"):
+        first = (result.compile_output.strip().splitlines() or [result.status])[-1]
+    elif not result.passed:
+        first = (result.run_output.strip().splitlines() or [f"exit code {result.exit_code}"])[-1]
+    else:
+        first = ""
+    return dict(row, status=result.status, exit_code=result.exit_code,
+                compile_seconds=round(result.compile_seconds, 3), run_seconds=round(result.run_seconds, 3),
+                cached=result.cached, errors=len(errors), warnings=len(warnings), diagnostic=first,
+                compile_output=result.compile_output, run_output=result.run_output)
+
+
+def run_matrix(source, suffix=".c", cells=None, pool=None, tracer=None):
+    """Build and run source in every cell at once on the sandbox pool (which has a worker per
+    core, and caches each compiler/flags combination separately). Returns the grid: one row
+    per cell, in matrix order."""
+    cells = MATRIX if cells is None else cells
+    pool = pool or get_default_pool()
+    tracer = tracer or get_tracer()
+    with tracer.span("matrix", cells=len(cells)) as span:
+        futures = {}
+        for cell in cells:
+            compiler = cell.compilers.get(suffix)
+            if compiler and shutil.which(compiler):
+                futures[cell.name] = pool.submit(source, suffix, compiler=compiler, flags=cell.flags)
+        grid = [cell_row(cell, suffix, futures.get(cell.name), source) for cell in cells]
+        span.set(passed=sum(row["status"] == "passed" for row in grid), ran=len(futures))
+    return grid
+
+
+def summary(grid):
+    """e.g. "2/3 cells passed, 1 unavailable"."""
+    ran = [row for row in grid if row["status"] != UNAVAILABLE]
+    text = f"{sum(row['status'] == 'passed' for row in ran)}/{len(ran)} cells passed"
+    if len(ran) < len(grid):
+        text += f", {len(grid) - len(ran)} unavailable"
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and run a test with every compiler/flag cell of the matrix.")
+    parser.add_argument("test", help="Test source (.c, .cpp or .f90).")
+    parser.add_argument("--cells", nargs="+", choices=[cell.name for cell in MATRIX], help="Only these cells.")
+    parser.add_argument("--json", action="store_true", help="Print the grid as JSON.")
+    args = parser.parse_args()
+
+    with open(args.test, 'r', encoding='utf-8') as file:
+        source = file.read()
+    cells = [cell for cell in MATRIX if not args.cells or cell.name in args.cells]
+    grid = run_matrix(source, os.path.splitext(args.test)[1], cells)
+    if args.json:
+        print(json.dumps(grid, indent=2))
+        return
+    for row in grid:
+        print(f"{row['cell']:<14} {row['status']:<15} {row['compile_seconds']:>7.2f}s {row['run_seconds']:>7.2f}s  "
+              f"{row['diagnostic']}")
+    print(summary(grid))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import os
+import re
+import time
+
+from sandbox import SandboxResult, get_default_pool
+from tracing import get_tracer
+
+# Status of a test turned away by the static checks; it was never given to a compiler.
+REJECTED = "rejected"
+REJECTED_EXIT_CODE = 1
+
+# OpenACC 3.3 directive and clause names. A run of these right before "construct",
+# "directive" or "clause" in the feature text is what the test has to use.
+DIRECTIVES = {
+    "parallel", "kernels", "serial", "data", "enter", "exit", "host_data", "loop", "cache", "atomic",
+    "read", "write", "update", "capture", "declare", "init", "shutdown", "set", "wait", "routine",
+}
+CLAUSES = {
+    "async", "wait", "num_gangs", "num_workers", "vector_length", "device_type", "dtype", "if", "self",
+    "reduction", "private", "firstprivate", "copy", "copyin", "copyout", "create", "no_create", "present",
+    "deviceptr", "attach", "detach", "delete", "default", "collapse", "gang", "worker", "vector", "seq",
+    "independent", "auto", "tile", "finalize", "if_present", "use_device", "device_resident", "link",
+    "bind", "nohost", "device", "host", "device_num", "default_async",
+}
+# Names that mean OpenACC wherever they appear in the feature text.
+DISTINCT = {name for name in DIRECTIVES | CLAUSES if "_" in name} | {"copyin", "copyout", "firstprivate",
+                                                                       "deviceptr", "nohost"}
+KEYWORDS = {"construct": DIRECTIVES, "constructs": DIRECTIVES, "directive": DIRECTIVES,
+            "directives": DIRECTIVES, "clause": CLAUSES, "clauses": CLAUSES}
+
+ROUTINE = re.compile(r"(?<![\w.])acc_[a-z0-9_]+\b(?!\.h)")
+C_COMMENT = re.compile(r"/\*.*?\*/|//[^\n]*", re.S)
+C_DIRECTIVE = re.compile(r"^[ \t]*#[ \t]*pragma[ \t]+acc\b((?:[^\n]*\\\n)*[^\n]*)", re.M)
+C_PRAGMA_OPERATOR = re.compile(r'_Pragma\s*\(\s*"acc\b([^"]*)"')
+FORTRAN_DIRECTIVE = re.compile(r"^[ \t]*!\$acc\b([^\n]*)", re.M | re.I)
+C_MAIN = re.compile(r"\bmain\s*\(")
+FORTRAN_PROGRAM = re.compile(r"^[ \t]*program[ \t]+\w+", re.M | re.I)
+
+
+def required_names(feature):
+    """The directive/clause names and API routines the feature text asks for."""
+    text = (feature or "").lower()
+    names = {word for word in re.findall(r"[a-z_]+", text) if word in DISTINCT}
+    words = re.findall(r"[a-z_]+", text)
+    for i, word in enumerate(words):
+        vocabulary = KEYWORDS.get(word)
+        j = i - 1
+        while vocabulary and j >= 0 and words[j] in vocabulary:
+            names.add(words[j])
+            j -= 1
+    return sorted(names), sorted(set(ROUTINE.findall(text)))
+
+
+def directive_text(code, suffix=".c"):
+    """Everything after "acc" in the test's OpenACC directives, lowercased."""
+    if suffix == ".f90":
+        return "\n".join(FORTRAN_DIRECTIVE.findall(code)).lower()
+    code = C_COMMENT.sub("", code)
+    parts = C_DIRECTIVE.findall(code) + C_PRAGMA_OPERATOR.findall(code)
+    return "\n".join(part.replace("\\\n", " ") for part in parts).lower()
+
+
+def static_problems(code, feature=None, suffix=".c"):
+    """What is wrong with the test that no compiler is needed to see, as messages for the
+    retry prompt. Empty if nothing is."""
+    if not code.strip():
+        return ["No code block was found in the response. Reply with the complete test program "
+                "inside a single ``` block."]
+
+    problems = []
+    fortran = suffix == ".f90"
+    body = code if fortran else C_COMMENT.sub("", code)
+    if fortran and not FORTRAN_PROGRAM.search(body):
+        problems.append("The test has no PROGRAM unit, so it cannot be built into an executable.")
+    elif not fortran and not C_MAIN.search(body):
+        problems.append("The test has no main() function, so it cannot be built into an executable. "
+                        "Write a complete program whose main() returns 0 if the feature works and non-zero otherwise.")
+
+    directives = directive_text(code, suffix)
+    routines = {name.lower() for name in ROUTINE.findall(body.lower() if fortran else body)}
+    if not directives and not routines:
+        marker = "!$acc" if fortran else "#pragma acc"
+        problems.append(f"The test uses no OpenACC directive ({marker} ...) or acc_* routine, "
+                        "so it does not test OpenACC at all.")
+        return problems
+
+    names, wanted_routines = required_names(feature)
+    missing = [name for name in names if not re.search(rf"\b{name}\b", directives)]
+    if missing:
+        problems.append(f"The feature under test needs {', '.join(missing)}, but no OpenACC directive in the test "
+                        f"uses {'it' if len(missing) == 1 else 'them'}. Test the requested feature, not a different one.")
+    for routine in wanted_routines:
+        if routine not in routines:
+            problems.append(f"The test never calls {routine}(), the routine under test.")
+    return problems
+
+
+def precheck(code, feature=None, suffix=".c", pool=None, syntax=True, tracer=None):
+    """Cheap checks before the full build and run: static_problems(), then a syntax-only
+    compile unless a full result is already cached. Returns the failed SandboxResult to use
+    instead of building (status REJECTED, or compile_error from the syntax pass), or None."""
+    pool = pool or get_default_pool()
+    tracer = tracer or get_tracer()
+    start = time.perf_counter()
+    with tracer.span("precheck") as span:
+        problems = static_problems(code, feature, suffix)
+        if problems:
+            span.set(status=REJECTED, problems=len(problems))
+            return SandboxResult(REJECTED, REJECTED_EXIT_CODE, "Rejected before compiling:\n" + "\n".join(problems),
+                                 compile_seconds=time.perf_counter() - start)
+        if not syntax or pool.is_cached(code, suffix):
+            span.set(status="skipped" if syntax else "static_only")
+            return None
+        result = pool.check_syntax(code, suffix)
+        span.set(status=result.status if result else "unsupported")
+        # Only a clear syntax error stops the build; a timeout or infrastructure error is left to it.
+        if result is not None and result.status == "compile_error":
+            return result
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pre-compile checks on a test file.")
+    parser.add_argument("test", help="Test source (.c, .cpp or .f90).")
+    parser.add_argument("--feature", help="Feature the test is for, e.g. \"copyin clause\".")
+    parser.add_argument("--no-syntax", action="store_true", help="Static checks only.")
+    args = parser.parse_args()
+
+    with open(args.test, 'r', encoding='utf-8') as file:
+        code = file.read()
+    result = precheck(code, args.feature, os.path.splitext(args.test)[1], syntax=not args.no_syntax)
+    if result is None:
+        print("passed")
+    else:
+        print(f"{result.status} ({result.compile_seconds * 1000:.1f} ms)\n{result.compile_output}")
+
+
+if __name__ == "__main__":
+    main()
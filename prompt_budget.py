@@ -0,0 +1,123 @@
+import functools
+import logging
+import os
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Tokenizer of the chat model served by the NIM; used only for counting. A local directory, or a
+# Hugging Face repo id already in the local cache: it is never downloaded (the repo is gated,
+# and the first count happens while a page renders). Set LLM4VV_TOKENIZER to point elsewhere.
+TOKENIZER_NAME = os.environ.get("LLM4VV_TOKENIZER", "mistralai/Mistral-Nemo-Instruct-2407")
+# Without the tokenizer, a token is taken to be this many characters. BPE tokens on C and
+# OpenACC code run about 3 to 4 characters, so this overcounts and the budgets still hold.
+CHARACTERS_PER_TOKEN = 3
+TRIM_MARKER = "\n[...]\n"
+
+
+@dataclass
+class Section:
+    """One piece of a prompt. Sections are emitted in order; when the prompt is too long,
+    the lowest-priority sections are trimmed first. Required sections are never cut."""
+    name: str
+    text: str
+    header: str = ""  # emitted around the text, dropped with it if the text is trimmed away
+    footer: str = ""
+    budget: int = None  # max tokens for this section, None for no per-section limit
+    priority: int = 0
+    required: bool = False
+    keep: str = "head"  # which end survives trimming: "head" or "tail"
+
+
+def approximate_tokens(text):
+    """Conservative token count from the length alone (see CHARACTERS_PER_TOKEN)."""
+    return -(-len(text) // CHARACTERS_PER_TOKEN)
+
+
+@functools.lru_cache(maxsize=None)
+def get_token_counter(tokenizer_name=TOKENIZER_NAME):
+    """Token counter for the target model, or approximate_tokens if its tokenizer isn't
+    available locally (or transformers isn't installed). Loaded once per name."""
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name, local_files_only=True)
+    except Exception as e:
+        logger.warning("Using approximate token counts (%d characters per token), could not load %s: %s",
+                       CHARACTERS_PER_TOKEN, tokenizer_name, e)
+        return approximate_tokens
+    return tokenizer_counter(tokenizer)
+
+
+def tokenizer_counter(tokenizer):
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def trim_to_tokens(text, max_tokens, count_tokens, keep="head"):
+    """Longest head (or tail) of text that fits in max_tokens, found by bisecting on characters."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    marker_tokens = count_tokens(TRIM_MARKER)
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        piece = text[:middle] if keep == "head" else text[len(text) - middle:]
+        if count_tokens(piece) + marker_tokens <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    if low == 0:
+        return ""
+    return text[:low] + TRIM_MARKER if keep == "head" else TRIM_MARKER + text[len(text) - low:]
+
+
+def render(section, text):
+    if not text and not section.required:
+        return ""
+    return section.header + text + section.footer
+
+
+def fit_section(section, max_tokens, count_tokens):
+    """Rendered section trimmed to at most max_tokens, headers included."""
+    text = section.text
+    frame = count_tokens(section.header + section.footer)
+    if count_tokens(render(section, text)) > max_tokens:
+        text = trim_to_tokens(text, max_tokens - frame, count_tokens, section.keep)
+    return render(section, text)
+
+
+def assemble(sections, max_tokens, count_tokens=None):
+    """Join sections into one prompt of at most max_tokens (required sections permitting).
+
+    Returns (prompt, report) where report maps section name to [tokens kept, tokens given].
+    """
+    count_tokens = count_tokens or get_token_counter()
+    rendered = {}
+    report = {}
+    for section in sections:
+        full = render(section, section.text)
+        rendered[section.name] = full
+        if section.budget is not None and not section.required:
+            rendered[section.name] = fit_section(section, section.budget, count_tokens)
+        report[section.name] = [count_tokens(rendered[section.name]), count_tokens(full)]
+
+    total = sum(kept for kept, _ in report.values())
+    for section in sorted((s for s in sections if not s.required), key=lambda s: s.priority):
+        if total <= max_tokens:
+            break
+        kept = report[section.name][0]
+        allowed = max(0, kept - (total - max_tokens))
+        rendered[section.name] = fit_section(section, allowed, count_tokens) if allowed else ""
+        report[section.name][0] = count_tokens(rendered[section.name])
+        total -= kept - report[section.name][0]
+
+    if total > max_tokens:
+        logger.warning("Prompt is %d tokens, over the %d budget, with only required sections left", total, max_tokens)
+    for name, (kept, original) in report.items():
+        if kept == 0 and original:
+            logger.info("Prompt budget: dropped %s (%d tokens)", name, original)
+        elif kept < original:
+            logger.info("Prompt budget: trimmed %s from %d to %d tokens", name, original, kept)
+
+    return "".join(rendered[section.name] for section in sections), report
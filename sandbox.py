@@ -0,0 +1,303 @@
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from compile_cache import CompileCache, cache_key, result_fields
+
+COMPILERS = {
+    ".c": "nvc",
+    ".cpp": "nvc++",
+    ".f90": "nvfortran",
+}
+COMPILE_FLAGS = ["-acc", "-Minfo=all"]
+
+MAX_WORKERS = os.cpu_count() or 4
+COMPILE_TIMEOUT = 120
+RUN_TIMEOUT = 30
+COMPILE_MEMORY_MB = 8192
+# CUDA reserves a very large virtual address space at startup, so an address-space
+# limit on GPU test binaries makes them fail spuriously. Set this for host/multicore runs.
+RUN_MEMORY_MB = None
+TIMEOUT_EXIT_CODE = 124
+# The compiler could not be started at all (not installed, unsupported file type, no
+# resources): the test was never compiled, so this counts as a compile failure.
+LAUNCH_ERROR = "launch_error"
+# Added to the build flags for a front-end-only pass: parse and type-check, no code generation,
+# link or run. Compilers that don't accept it skip the pass (see syntax_only_supported()).
+SYNTAX_ONLY_FLAGS = ["-fsyntax-only"]
+# Run by _limit_memory() as: python -c LIMIT_MEMORY <bytes> <command...>. If the command can't be
+# exec'd, it exits with LAUNCH_FAILED and the error, which run_limited() raises as an OSError.
+LAUNCH_FAILED = 127
+LAUNCH_FAILED_PREFIX = "llm4vv-sandbox: "
+LIMIT_MEMORY = f"""
+import os, resource, sys
+limit = int(sys.argv[1])
+resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+try:
+    os.execvp(sys.argv[2], sys.argv[2:])
+except OSError as e:
+    sys.stderr.write({LAUNCH_FAILED_PREFIX!r} + f"{{e.errno}} {{e.strerror}}")
+    sys.exit({LAUNCH_FAILED})
+"""
+MINIMAL_PROGRAMS = {
+    ".c": "int main(void) { return 0; }\n",
+    ".cpp": "int main() { return 0; }\n",
+    ".f90": "program minimal\nend program minimal\n",
+}
+
+
+@dataclass
+class SandboxResult:
+    status: str  # passed, failed, compile_error, compile_timeout, run_timeout, launch_error, error
+    exit_code: int
+    compile_output: str = ""
+    run_output: str = ""
+    compile_seconds: float = 0.0
+    run_seconds: float = 0.0
+    cached: bool = False
+
+    @property
+    def passed(self):
+        return self.status == "passed"
+
+    def as_tuple(self):
+        """The (exit_code, compile_output, run_output) triple the rest of the code expects."""
+        return self.exit_code, self.compile_output, self.run_output
+
+
+def _limit_memory(command, limit_mb):
+    """command, started through a small Python program that sets the address-space limit and
+    then execs it. preexec_fn would do the same in the forked child, but it is not safe to use
+    from the pool's threads (the child can deadlock on a lock another thread held)."""
+    if not limit_mb:
+        return command
+    return [sys.executable, "-c", LIMIT_MEMORY, str(limit_mb * 1024 * 1024), *command]
+
+
+def run_limited(command, cwd, timeout, memory_mb=None):
+    """Run command in its own process group; kill the whole group on timeout.
+
+    Returns (returncode, stdout, stderr, timed_out, seconds). Raises OSError if command can't be started.
+    """
+    start = time.monotonic()
+    process = subprocess.Popen(
+        _limit_memory(command, memory_mb),
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        start_new_session=True,
+    )
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+        timed_out = False
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        stdout, stderr = process.communicate()
+        timed_out = True
+    if process.returncode == LAUNCH_FAILED and (stderr or "").startswith(LAUNCH_FAILED_PREFIX):
+        errno, _, strerror = stderr[len(LAUNCH_FAILED_PREFIX):].partition(" ")
+        raise OSError(int(errno), strerror.strip(), command[0])
+    return process.returncode, stdout or "", stderr or "", timed_out, time.monotonic() - start
+
+
+def compile_and_run(source, suffix=".c", compiler=None, flags=None,
+                    compile_timeout=COMPILE_TIMEOUT, run_timeout=RUN_TIMEOUT,
+                    compile_memory_mb=COMPILE_MEMORY_MB, run_memory_mb=RUN_MEMORY_MB, binary_dest=None):
+    """Compile and run one test in a private temporary directory that is removed afterwards.
+
+    If binary_dest is given, the compiled binary is copied there before cleanup.
+    """
+    compiler = compiler or COMPILERS.get(suffix)
+    if compiler is None:
+        return SandboxResult(LAUNCH_ERROR, 1, "Unsupported file type")
+    flags = COMPILE_FLAGS if flags is None else flags
+
+    with tempfile.TemporaryDirectory(prefix="llm4vv-") as workdir:
+        source_name = "test" + suffix
+        with open(os.path.join(workdir, source_name), 'w', encoding='utf-8') as file:
+            file.write(source)
+
+        try:
+            returncode, stdout, stderr, timed_out, compile_seconds = run_limited(
+                [compiler, *flags, "-o", "test", source_name], workdir, compile_timeout, compile_memory_mb)
+        except OSError as e:
+            return SandboxResult(LAUNCH_ERROR, 1, f"An error occurred: {e}")
+        compile_output = stderr.strip() if stderr else stdout.strip()
+
+        if timed_out:
+            return SandboxResult("compile_timeout", TIMEOUT_EXIT_CODE,
+                                 f"{compile_output}\nCompilation timed out after {compile_timeout}s".strip(),
+                                 compile_seconds=compile_seconds)
+        if returncode != 0:
+            return SandboxResult("compile_error", returncode, compile_output, compile_seconds=compile_seconds)
+        if binary_dest:
+            shutil.copy2(os.path.join(workdir, "test"), binary_dest)
+
+        try:
+            returncode, stdout, stderr, timed_out, run_seconds = run_limited(
+                ["./test"], workdir, run_timeout, run_memory_mb)
+        except OSError as e:
+            return SandboxResult("error", 1, compile_output, f"An error occurred: {e}", compile_seconds)
+        run_output = stdout.strip() if stdout else stderr.strip()
+
+        if timed_out:
+            return SandboxResult("run_timeout", TIMEOUT_EXIT_CODE, compile_output,
+                                 f"{run_output}\nTest timed out after {run_timeout}s".strip(),
+                                 compile_seconds, run_seconds)
+        status = "passed" if returncode == 0 else "failed"
+        return SandboxResult(status, returncode, compile_output, run_output, compile_seconds, run_seconds)
+
+
+def check_syntax(source, suffix=".c", compiler=None, flags=None,
+                 compile_timeout=COMPILE_TIMEOUT, compile_memory_mb=COMPILE_MEMORY_MB):
+    """Run only the compiler front end on one test, in a private temporary directory.
+
+    Status is passed, compile_error, compile_timeout or launch_error, as for compile_and_run().
+    """
+    compiler = compiler or COMPILERS.get(suffix)
+    if compiler is None:
+        return SandboxResult(LAUNCH_ERROR, 1, "Unsupported file type")
+    flags = COMPILE_FLAGS if flags is None else flags
+
+    with tempfile.TemporaryDirectory(prefix="llm4vv-") as workdir:
+        source_name = "test" + suffix
+        with open(os.path.join(workdir, source_name), 'w', encoding='utf-8') as file:
+            file.write(source)
+        try:
+            returncode, stdout, stderr, timed_out, compile_seconds = run_limited(
+                [compiler, *flags, *SYNTAX_ONLY_FLAGS, source_name], workdir, compile_timeout, compile_memory_mb)
+        except OSError as e:
+            return SandboxResult(LAUNCH_ERROR, 1, f"An error occurred: {e}")
+    compile_output = stderr.strip() if stderr else stdout.strip()
+
+    if timed_out:
+        return SandboxResult("compile_timeout", TIMEOUT_EXIT_CODE,
+                             f"{compile_output}\nSyntax check timed out after {compile_timeout}s".strip(),
+                             compile_seconds=compile_seconds)
+    if returncode != 0:
+        return SandboxResult("compile_error", returncode, compile_output, compile_seconds=compile_seconds)
+    return SandboxResult("passed", 0, compile_output, compile_seconds=compile_seconds)
+
+
+@lru_cache(maxsize=None)
+def syntax_only_supported(compiler, suffix, flags):
+    """Whether compiler accepts SYNTAX_ONLY_FLAGS with these flags (a tuple), judged by a
+    program that must compile. Checked once per process."""
+    return check_syntax(MINIMAL_PROGRAMS.get(suffix, ""), suffix, compiler, list(flags)).passed
+
+
+class SandboxPool:
+    """Bounded pool of compile-and-run jobs. Safe to share between sessions and batch runs.
+
+    With a CompileCache, a job whose source, compiler and flags were seen before returns
+    the stored result without compiling, and identical jobs already running are shared.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, cache=None, **limits):
+        self.max_workers = max_workers
+        self.cache = cache
+        self.limits = limits
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sandbox")
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def _build(self, suffix, options):
+        """The compiler and flags a job with these options builds with."""
+        compiler = options.get("compiler") or COMPILERS.get(suffix)
+        flags = COMPILE_FLAGS if options.get("flags") is None else options["flags"]
+        return compiler, flags
+
+    def submit(self, source, suffix=".c", **kwargs):
+        options = dict(self.limits, **kwargs)
+        compiler, flags = self._build(suffix, options)
+        if self.cache is None or compiler is None:
+            return self.executor.submit(compile_and_run, source, suffix, **options)
+        key = cache_key(source, suffix, compiler, flags)
+
+        with self.lock:
+            if key in self.in_flight:
+                return self.in_flight[key]
+            fields = self.cache.get(key)
+            if fields is not None:
+                future = Future()
+                future.set_result(SandboxResult(**fields, cached=True))
+                return future
+            future = self.executor.submit(self._run_and_store, key, source, suffix, options)
+            self.in_flight[key] = future
+        future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def _run_and_store(self, key, source, suffix, options):
+        with tempfile.TemporaryDirectory(prefix="llm4vv-bin-") as tmp:
+            binary = os.path.join(tmp, "test")
+            result = compile_and_run(source, suffix, binary_dest=binary, **options)
+            self.cache.put(key, result_fields(result), binary)
+        return result
+
+    def _forget(self, key):
+        with self.lock:
+            self.in_flight.pop(key, None)
+
+    def run(self, source, suffix=".c", **kwargs):
+        return self.submit(source, suffix, **kwargs).result()
+
+    def is_cached(self, source, suffix=".c", **kwargs):
+        """Whether a full build and run of source is already in the cache (False without one).
+        Not counted as a cache hit or miss; the build that follows is."""
+        compiler, flags = self._build(suffix, dict(self.limits, **kwargs))
+        if self.cache is None or compiler is None:
+            return False
+        return self.cache.contains(cache_key(source, suffix, compiler, flags))
+
+    def check_syntax(self, source, suffix=".c", **kwargs):
+        """Front-end-only pass with the compiler and flags a full build would use, on one of the
+        pool's workers. Returns None if the compiler has no syntax-only mode."""
+        options = dict(self.limits, **kwargs)
+        compiler, flags = self._build(suffix, options)
+        if compiler is None or not shutil.which(compiler):
+            return None
+        limits = {name: options[name] for name in ("compile_timeout", "compile_memory_mb") if name in options}
+        return self.executor.submit(self._check_syntax, source, suffix, compiler, flags, limits).result()
+
+    def _check_syntax(self, source, suffix, compiler, flags, limits):
+        if not syntax_only_supported(compiler, suffix, tuple(flags)):
+            return None
+        return check_syntax(source, suffix, compiler, flags, **limits)
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache else {"hits": 0, "misses": 0}
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SandboxPool(cache=CompileCache())
+        return _default_pool
+
+
+def set_default_pool(pool):
+    """Replace the shared pool, e.g. to run everything with another compiler. Returns the old one."""
+    global _default_pool
+    with _default_pool_lock:
+        previous, _default_pool = _default_pool, pool
+        return previous
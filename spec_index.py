@@ -0,0 +1,329 @@
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+
+from http_clients import pooled
+from lexical import BM25Index
+from spec_normalize import NORMALIZER_VERSION, hash_file, load_normalized_spec
+
+EMBED_URL = "http://localhost:8081/v1"
+EMBEDDING_MODEL = "NV-Embed-QA"
+INDEX_DIR = "index"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+
+# Spec versions by name. spec.txt predates specs/ and stays where it is; every
+# specs/<name>.txt is picked up as another version (e.g. specs/openacc-3.2.txt, specs/openmp-5.2.txt).
+DEFAULT_SPEC = "openacc-3.3"
+SPECS = {DEFAULT_SPEC: "spec.txt"}
+SPEC_DIR = "specs"
+
+# One shard per spec version under index/shards/<name>/<version>/, where the version is
+# a hash of everything the chunks depend on. A shard is never modified once written.
+SHARDS_DIR = "shards"
+MANIFEST_FILE = "manifest.json"
+TEXT_FILE = "text.txt"  # the normalized spec the offsets point into
+OFFSETS_FILE = "offsets.npy"  # int64 [chunks, 2]: byte start and end of each chunk in TEXT_FILE
+LEXICAL_FILE = "bm25.json"
+SECTIONS_FILE = "sections.json"
+
+# "vector": embeddings only, "lexical": BM25 only (no embedding service needed),
+# "hybrid": both, with normalized scores mixed by HYBRID_ALPHA (weight of the vector score).
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+HYBRID_ALPHA = 0.5
+HYBRID_CANDIDATES = 4  # candidates per ranker, as a multiple of k
+EMBED_CONCURRENCY = 8  # requests in flight to the embedding NIM (see http_clients.py)
+
+# langchain and the NVIDIA client take a couple of seconds to import, so they are
+# imported where they are used: the UI can render, and a lexical-only retriever can answer,
+# without them.
+
+
+def available_specs(spec_dir=SPEC_DIR):
+    """{name: path} of every spec version: SPECS plus the .txt files in spec_dir."""
+    specs = dict(SPECS)
+    if os.path.isdir(spec_dir):
+        for name in sorted(os.listdir(spec_dir)):
+            if name.endswith(".txt"):
+                specs[name[:-len(".txt")]] = os.path.join(spec_dir, name)
+    return specs
+
+
+def resolve_spec(spec):
+    """(name, path) for a spec version name or a spec file path."""
+    specs = available_specs()
+    if spec in specs:
+        return spec, specs[spec]
+    for name, path in specs.items():
+        if os.path.abspath(path) == os.path.abspath(spec):
+            return name, path
+    if os.path.exists(spec):
+        return os.path.splitext(os.path.basename(spec))[0], spec
+    raise ValueError(f"Unknown spec {spec!r}; known versions: {', '.join(specs)}")
+
+
+def shard_root(spec_path, index_dir=INDEX_DIR):
+    """Directory holding every version of this spec's shard (and its section index)."""
+    return os.path.join(index_dir, SHARDS_DIR, resolve_spec(spec_path)[0])
+
+
+def make_manifest(spec_path, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Everything the chunks depend on; a change in any of it means a new shard version."""
+    return {
+        "spec_sha256": hash_file(spec_path),
+        "normalizer": NORMALIZER_VERSION,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+    }
+
+
+def shard_version(manifest):
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def embeddings_file(embedding_model):
+    return f"embeddings.{re.sub(r'[^A-Za-z0-9._-]', '_', embedding_model)}.npy"
+
+
+def split_spec(content, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return text_splitter.split_text(content)
+
+
+def chunk_offsets(text, chunks):
+    """Byte (start, end) of each chunk in the UTF-8 encoding of text. Chunks overlap, so each
+    is looked for from just after the previous one's start."""
+    offsets = []
+    cursor = 0
+    char_start, byte_start = 0, 0
+    for chunk in chunks:
+        start = text.find(chunk, cursor)
+        if start < 0:
+            raise ValueError(f"chunk not found in the spec text: {chunk[:60]!r}")
+        byte_start += len(text[char_start:start].encode('utf-8'))
+        char_start = start
+        offsets.append((byte_start, byte_start + len(chunk.encode('utf-8'))))
+        cursor = start + 1
+    return np.array(offsets, dtype=np.int64).reshape(-1, 2)
+
+
+def make_embeddings(embedding_model=EMBEDDING_MODEL, base_url=EMBED_URL):
+    from langchain_nvidia_ai_endpoints import NVIDIAEmbeddings
+    return pooled(NVIDIAEmbeddings(base_url=base_url, model=embedding_model), EMBED_CONCURRENCY)
+
+
+def build_shard(spec_path, index_dir=INDEX_DIR, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, force=False):
+    """Split the spec into a shard (text, chunk offsets, BM25) unless the current version exists.
+    Returns the shard's directory. Nothing is embedded here; see add_embeddings."""
+    manifest = make_manifest(spec_path, chunk_size, chunk_overlap)
+    path = os.path.join(shard_root(spec_path, index_dir), shard_version(manifest))
+    if os.path.exists(os.path.join(path, MANIFEST_FILE)) and not force:
+        return path
+
+    # Chunks come from the cleaned spec (no PDF line numbers or page furniture).
+    text = load_normalized_spec(spec_path, cache_dir=index_dir)
+    chunks = split_spec(text, chunk_size, chunk_overlap)
+
+    # Written next to the final directory and renamed into place, so another process never
+    # sees a half-written shard; if one finished the same version first, its copy is kept.
+    staging = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    with open(os.path.join(staging, TEXT_FILE), 'w', encoding='utf-8', newline='') as file:
+        file.write(text)
+    np.save(os.path.join(staging, OFFSETS_FILE), chunk_offsets(text, chunks))
+    with open(os.path.join(staging, LEXICAL_FILE), 'w', encoding='utf-8') as file:
+        json.dump(BM25Index.build(chunks).to_dict(), file)
+    with open(os.path.join(staging, MANIFEST_FILE), 'w', encoding='utf-8') as file:
+        json.dump(dict(manifest, spec=resolve_spec(spec_path)[0], num_chunks=len(chunks), built_at=time.time()),
+                  file, indent=2)
+    if force:
+        shutil.rmtree(path, ignore_errors=True)
+    try:
+        os.rename(staging, path)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+    return path
+
+
+def add_embeddings(shard, embeddings, embedding_model=EMBEDDING_MODEL):
+    """Embed the shard's chunks and store them as a float32 matrix next to it."""
+    vectors = np.asarray(embeddings.embed_documents([shard[i] for i in range(len(shard))]), dtype=np.float32)
+    target = os.path.join(shard.path, embeddings_file(embedding_model))
+    staging = f"{target}.tmp-{os.getpid()}.npy"
+    np.save(staging, vectors)
+    os.replace(staging, target)
+    return target
+
+
+class Shard:
+    """One spec version's chunks, read through memory maps: the text and offsets, and the
+    embedding matrices once built. Shards are read-only, so every process that opens one
+    shares its pages through the OS page cache instead of holding a private copy."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as file:
+            self.manifest = json.load(file)
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(path, TEXT_FILE), 'rb') as file:
+            self.text = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else b""
+        self._lexical = None
+        self._matrices = {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, chunk):
+        start, end = self.offsets[chunk]
+        return self.text[start:end].decode('utf-8')
+
+    def lexical(self):
+        if self._lexical is None:
+            with open(os.path.join(self.path, LEXICAL_FILE), 'r', encoding='utf-8') as file:
+                self._lexical = BM25Index.from_dict(json.load(file))
+        return self._lexical
+
+    def matrix(self, embedding_model=EMBEDDING_MODEL):
+        """(embeddings, squared norms) for the model, or None if the shard wasn't embedded with it."""
+        if embedding_model not in self._matrices:
+            path = os.path.join(self.path, embeddings_file(embedding_model))
+            if not os.path.exists(path):
+                return None
+            vectors = np.load(path, mmap_mode="r")
+            self._matrices[embedding_model] = vectors, np.einsum('ij,ij->i', vectors, vectors)
+        return self._matrices[embedding_model]
+
+
+@functools.lru_cache(maxsize=None)
+def open_shard(path):
+    """One Shard object per directory per process."""
+    return Shard(path)
+
+
+def normalize_scores(scores):
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    if high == low:
+        return {doc_id: 1.0 for doc_id in scores}
+    return {doc_id: (score - low) / (high - low) for doc_id, score in scores.items()}
+
+
+class SpecRetriever:
+    """Vector, BM25 or hybrid search over one spec shard.
+
+    Exposes similarity_search/asimilarity_search, like a langchain vector store.
+    """
+
+    def __init__(self, shard, mode="hybrid", embeddings=None, embedding_model=EMBEDDING_MODEL, alpha=HYBRID_ALPHA,
+                 spec_path=None):
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        self.shard = shard
+        self.mode = mode
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model
+        self.alpha = alpha
+        self.spec_path = spec_path
+
+    def vector_scores(self, query, n):
+        # Exact L2 search over the memory-mapped matrix, turned into "higher is better".
+        vectors, norms = self.shard.matrix(self.embedding_model)
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        distances = norms - 2 * (vectors @ query_vector) + query_vector @ query_vector
+        n = min(n, len(distances))
+        nearest = np.argpartition(distances, n - 1)[:n] if n else []
+        return {int(i): 1.0 / (1.0 + max(float(distances[i]), 0.0)) for i in nearest}
+
+    def similarity_search(self, query, k=3):
+        from langchain_core.documents import Document
+
+        if self.mode == "vector":
+            scores = self.vector_scores(query, k)
+            ranked = sorted(scores, key=scores.get, reverse=True)
+        elif self.mode == "lexical":
+            ranked = [doc_id for doc_id, _ in self.shard.lexical().search(query, k)]
+        else:
+            n = k * HYBRID_CANDIDATES
+            lexical = normalize_scores(dict(self.shard.lexical().search(query, n)))
+            vector = normalize_scores(self.vector_scores(query, n))
+            fused = {doc_id: self.alpha * vector.get(doc_id, 0.0) + (1 - self.alpha) * lexical.get(doc_id, 0.0)
+                     for doc_id in set(lexical) | set(vector)}
+            ranked = sorted(fused, key=fused.get, reverse=True)[:k]
+        return [Document(page_content=self.shard[doc_id], metadata={"chunk": doc_id}) for doc_id in ranked]
+
+    async def asimilarity_search(self, query, k=3):
+        return await asyncio.to_thread(self.similarity_search, query, k)
+
+
+def load_retriever(spec_path, mode="hybrid", index_dir=INDEX_DIR, embedding_model=EMBEDDING_MODEL,
+                   embed_url=EMBED_URL, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Retriever over the spec's current shard, building or embedding it first if needed."""
+    shard = open_shard(build_shard(spec_path, index_dir, chunk_size, chunk_overlap))
+    embeddings = None
+    if mode != "lexical":
+        embeddings = make_embeddings(embedding_model, embed_url)
+        if shard.matrix(embedding_model) is None:
+            add_embeddings(shard, embeddings, embedding_model)
+    return SpecRetriever(shard, mode, embeddings, embedding_model, spec_path=spec_path)
+
+
+def prune(spec_path, index_dir=INDEX_DIR, keep=None):
+    """Delete this spec's shard versions other than keep. Returns the removed directories."""
+    root = shard_root(spec_path, index_dir)
+    removed = []
+    for name in os.listdir(root) if os.path.isdir(root) else []:
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and path != keep:
+            shutil.rmtree(path)
+            removed.append(path)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prebuild the spec shards used by main.py.")
+    parser.add_argument("--spec", nargs="+", default=[DEFAULT_SPEC],
+                        help="Spec versions or files to build; 'all' for every version.")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--embedding-model", default=EMBEDDING_MODEL)
+    parser.add_argument("--embed-url", default=EMBED_URL)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the current version exists.")
+    parser.add_argument("--lexical-only", action="store_true", help="Skip the embeddings (no embedding service).")
+    parser.add_argument("--prune", action="store_true", help="Delete older versions of each shard.")
+    parser.add_argument("--list", action="store_true", help="List the known spec versions and exit.")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, path in available_specs().items():
+            print(f"{name}: {path}")
+        return
+
+    specs = list(available_specs()) if args.spec == ["all"] else args.spec
+    for spec in specs:
+        name, spec_path = resolve_spec(spec)
+        start = time.time()
+        path = build_shard(spec_path, args.index_dir, args.chunk_size, args.chunk_overlap, args.force)
+        shard = open_shard(path)
+        if not args.lexical_only and (args.force or shard.matrix(args.embedding_model) is None):
+            add_embeddings(shard, make_embeddings(args.embedding_model, args.embed_url), args.embedding_model)
+        print(f"{name}: {len(shard)} chunks in {path} ({time.time() - start:.1f}s)")
+        if args.prune:
+            for removed in prune(spec_path, args.index_dir, keep=path):
+                print(f"  removed {removed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+
+CACHE_DIR = "index"
+# Bump when the rules below change, so cached copies and the indexes built on them are redone.
+NORMALIZER_VERSION = 2
+
+LIGATURES = {"\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi", "\ufb04": "ffl"}
+LINE_NUMBER = re.compile(r'^(\d+)(?: (.*))?$')
+LINE_NUMBER_WINDOW = 50
+# A word broken across PDF lines comes out as "Open\x02853 ACC": the next line's number lands
+# mid-word, after a control character left by the PDF extraction.
+BROKEN_WORD = re.compile(r'([A-Za-z])\x02?(\d+) (?=[A-Za-z])')
+CONTROL_CHARACTERS = re.compile(r'[\x00-\x08\x0b-\x1f\x7f]')
+PAGE_FURNITURE = [
+    re.compile(r'^The OpenACC$'),
+    re.compile(r'^R API Version \d'),
+    re.compile(r'^[HN] [HN]$'),  # margin markers around examples
+]
+
+
+def fix_ligatures(text):
+    for ligature, letters in LIGATURES.items():
+        text = text.replace(ligature, letters)
+    return text
+
+
+def count_tokens(text):
+    """Rough, tokenizer-free token count (words and punctuation) for before/after reports."""
+    return len(re.findall(r'\w+|[^\w\s]', text))
+
+
+def is_furniture(text):
+    return any(pattern.match(text) for pattern in PAGE_FURNITURE)
+
+
+def normalize_lines(lines):
+    """Strip PDF line numbers, page headers/footers and broken words.
+
+    Returns (clean_lines, line_map), where line_map[i] = [file line, spec line number or None]
+    for clean line i. The map is saved next to the cleaned copy, to trace its text back to the spec.
+    """
+    clean_lines = []
+    line_map = []
+    expected = None
+
+    for file_line, raw in enumerate(lines, start=1):
+        raw = fix_ligatures(raw.rstrip("\n"))
+        match = LINE_NUMBER.match(raw)
+        number = int(match.group(1)) if match else None
+        if match and expected is not None and abs(number - expected) > LINE_NUMBER_WINDOW:
+            match = None  # a page number, or text that merely starts with a number
+
+        if match is None:
+            if raw.strip().isdigit():
+                continue
+            text = raw
+            number = None
+        else:
+            # Empty numbered lines are kept as paragraph breaks.
+            text = match.group(2) or ""
+            expected = number + 1
+
+        if is_furniture(text.strip()):
+            continue
+
+        def join(word_match):
+            nonlocal expected
+            if expected is not None and int(word_match.group(2)) == expected:
+                expected += 1
+                return word_match.group(1)
+            return word_match.group(0)
+
+        text = CONTROL_CHARACTERS.sub("", BROKEN_WORD.sub(join, text))
+        clean_lines.append(text)
+        line_map.append([file_line, number])
+
+    return clean_lines, line_map
+
+
+def normalize_spec(text):
+    clean_lines, line_map = normalize_lines(text.splitlines())
+    return "\n".join(clean_lines) + "\n", line_map
+
+
+def hash_file(file_path):
+    """SHA-256 of the file's bytes; what every spec-derived file records to notice a changed spec."""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def normalized_paths(spec_path, cache_dir=CACHE_DIR):
+    base = os.path.splitext(os.path.basename(spec_path))[0]
+    return os.path.join(cache_dir, f"{base}.clean.txt"), os.path.join(cache_dir, f"{base}.clean.map.json")
+
+
+def normalize_spec_file(spec_path, cache_dir=CACHE_DIR, force=False):
+    """Return (clean_path, info), writing the cleaned spec and its line map if they are stale.
+
+    info holds the line map and token counts before and after cleaning.
+    """
+    clean_path, map_path = normalized_paths(spec_path, cache_dir)
+    digest = hash_file(spec_path)
+    if not force and os.path.exists(clean_path) and os.path.exists(map_path):
+        with open(map_path, 'r', encoding='utf-8') as file:
+            info = json.load(file)
+        if info.get("spec_sha256") == digest and info.get("version") == NORMALIZER_VERSION:
+            return clean_path, info
+
+    with open(spec_path, 'r', encoding='utf-8') as file:
+        original = file.read()
+    clean, line_map = normalize_spec(original)
+    info = {
+        "spec_sha256": digest,
+        "version": NORMALIZER_VERSION,
+        "tokens_before": count_tokens(original),
+        "tokens_after": count_tokens(clean),
+        "lines": line_map,
+    }
+
+    # Each file is written under a temporary name and renamed into place, so a reader never
+    # sees it half-written. The map goes last: it is what marks the cleaned copy current.
+    os.makedirs(cache_dir, exist_ok=True)
+    staging = f".tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(clean_path + staging, 'w', encoding='utf-8') as file:
+        file.write(clean)
+    os.replace(clean_path + staging, clean_path)
+    with open(map_path + staging, 'w', encoding='utf-8') as file:
+        json.dump(info, file)
+    os.replace(map_path + staging, map_path)
+    return clean_path, info
+
+
+def load_normalized_spec(spec_path, cache_dir=CACHE_DIR):
+    clean_path, _ = normalize_spec_file(spec_path, cache_dir)
+    with open(clean_path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a cleaned copy of the spec for indexing and prompts.")
+    parser.add_argument("--spec", default="spec.txt")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    clean_path, info = normalize_spec_file(args.spec, args.cache_dir, args.force)
+    saved = info["tokens_before"] - info["tokens_after"]
+    percent = 100 * saved / info["tokens_before"] if info["tokens_before"] else 0
+    print(f"{clean_path}: ~{info['tokens_before']} -> ~{info['tokens_after']} tokens ({saved} saved, {percent:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,472 @@
+import argparse
+import difflib
+import json
+import mmap
+import os
+import re
+
+from spec_normalize import NORMALIZER_VERSION, fix_ligatures, hash_file, normalize_spec_file
+
+SECTIONS_FILE = os.path.join("index", "sections.json")
+FUZZY_CUTOFF = 0.85
+
+# Section headings as they appear in the spec's table of contents.
+TOC = """1 Introduction
+11 Scope                                         
+12 Execution Model                                   
+13 Memory Model                                    
+14 Language Interoperability                               
+15 Runtime Errors                                    
+16 Conventions used in this document                          
+17 Organization of this document                            
+18 References                                       
+19 Changes from Version 10 to 20                           
+110 Corrections in the August 2013 document                      
+111 Changes from Version 20 to 25                           
+112 Changes from Version 25 to 26                           
+113 Changes from Version 26 to 27                           
+114 Changes from Version 27 to 30                           
+115 Changes from Version 30 to 31                           
+116 Changes from Version 31 to 32                           
+117 Changes from Version 32 to 33                           
+118 Topics Deferred For a Future Revision                        
+2 Directives
+21 Directive Format                                   
+22 Conditional Compilation                               
+23 Internal Control Variables                               
+231 Modifying and Retrieving ICV Values                    
+24 Device-Speciﬁc Clauses                               
+25 Compute Constructs                                  
+251 Parallel Construct                               
+252 Serial Construct                                
+253 Kernels Construct                               
+254 Compute Construct Restrictions                       
+255 Compute Construct Errors                          
+256 if clause                                    
+257 self clause                                   
+258 async clause                                 
+259 wait clause                                  
+2510 num gangs clause                               
+2511 num workers clause                             
+2512 vector length clause                             
+2513 private clause                                 
+2514 ﬁrstprivate clause                               
+2515 reduction clause                               
+2516 default clause                                 
+
+26 Data Environment                                   
+261 Variables with Predetermined Data Attributes                
+262 Variables with Implicitly Determined Data Attributes            
+263 Data Regions and Data Lifetimes                      
+264 Data Structures with Pointers                         
+265 Data Construct                                
+266 Enter Data and Exit Data Directives                     
+267 Reference Counters                              
+268 Attachment Counter                             
+27 Data Clauses                                     
+271 Data Speciﬁcation in Data Clauses                      
+272 Data Clause Actions                             
+273 Data Clause Errors                              
+274 deviceptr clause                                
+275 present clause                                 
+276 copy clause                                  
+277 copyin clause                                 
+278 copyout clause                                
+279 create clause                                 
+2710 no create clause                                
+2711 delete clause                                 
+2712 attach clause                                 
+2713 detach clause                                 
+28 Host Data Construct                                 
+281 use device clause                               
+282 if clause                                    
+283 if present clause                               
+29 Loop Construct                                    
+291 collapse clause                                
+292 gang clause                                  
+293 worker clause                                 
+294 vector clause                                 
+295 seq clause                                   
+296 independent clause                              
+297 auto clause                                  
+298 tile clause                                   
+299 device type clause                              
+2910 private clause                                 
+2911 reduction clause                               
+210 Cache Directive                                    
+211 Combined Constructs                                 
+212 Atomic Construct                                   
+213 Declare Directive                                   
+2131 device resident clause                            
+2132 create clause                                 
+2133 link clause                                  
+214 Executable Directives                                 
+2141 Init Directive                                 
+
+2142 Shutdown Directive                              
+2143 Set Directive                                 
+2144 Update Directive                               
+2145 Wait Directive                                
+2146 Enter Data Directive                             
+2147 Exit Data Directive                              
+215 Procedure Calls in Compute Regions                         
+2151 Routine Directive                               
+2152 Global Data Access                              
+216 Asynchronous Behavior                                
+2161 async clause                                 
+2162 wait clause                                  
+2163 Wait Directive                                
+217 Fortran Speciﬁc Behavior                               
+2171 Optional Arguments                             
+2172 Do Concurrent Construct                           
+3 Runtime Library
+31 Runtime Library Deﬁnitions                             
+32 Runtime Library Routines                              
+321 acc getnum devices                             
+322 acc setdevice type                              
+323 acc getdevice type                              
+324 acc setdevice num                              
+325 acc getdevice num                              
+326 acc getproperty                               
+327 acc init                                    
+328 acc shutdown                                 
+329 acc async test                                 
+3210 acc wait                                    
+3211 acc wait async                                
+3212 acc wait any                                 
+3213 acc getdefault async                             
+3214 acc setdefault async                             
+3215 acc ondevice                                 
+3216 acc malloc                                  
+3217 acc free                                    
+3218 acc copyin and acc create                          
+3219 acc copyout and acc delete                          
+3220 acc update device and acc update self                    
+3221 acc map data                                 
+3222 acc unmap data                                
+3223 acc deviceptr                                 
+3224 acc hostptr                                  
+3225 acc ispresent                                 
+3226 acc memcpy todevice                            
+3227 acc memcpy from device                          
+3228 acc memcpy device                             
+
+3229 acc attach and acc detach                          
+3230 acc memcpy d2d                               
+4 Environment Variables
+41 ACC DEVICE TYPE                                 
+42 ACC DEVICE NUM                                 
+43 ACC PROFLIB                                    
+5 Proﬁling and Error Callback Interface
+51 Events                                         
+511 Runtime Initialization and Shutdown                    
+512 Device Initialization and Shutdown                     
+513 Enter Data and Exit Data                           
+514 Data Allocation                                
+515 Data Construct                                
+516 Update Directive                               
+517 Compute Construct                              
+518 Enqueue Kernel Launch                           
+519 Enqueue Data Update (Upload and Download)               
+5110 Wait                                      
+5111 Error Event                                  
+52 Callbacks Signature                                  
+521 First Argument: General Information                    
+522 Second Argument: Event-Speciﬁc Information               
+523 Third Argument: API-Speciﬁc Information                 
+53 Loading the Library                                  
+531 Library Registration                             
+532 Statically-Linked Library Initialization                   
+533 Runtime Dynamic Library Loading                     
+534 Preloading with LD PRELOAD                       
+535 Application-Controlled Initialization                     
+54 Registering Event Callbacks                             
+541 Event Registration and Unregistration                    
+542 Disabling and Enabling Callbacks                      
+55 Advanced Topics                                   
+551 Dynamic Behavior                              
+552 OpenACC Events During Event Processing                 
+553 Multiple Host Threads                            
+6 Glossary
+A Recommendations for Implementers
+A1 Target Devices                                    
+A11 NVIDIA GPU Targets                            
+A12 AMD GPU Targets                              
+A13 Multicore Host CPU Target                         
+A2 API Routines for Target Platforms                          
+A21 NVIDIA CUDA Platform                          
+
+A22 OpenCL Target Platform                           
+A3 Recommended Options and Diagnostics                       
+A31 C Pointer in Present clause                          
+A32 Nonconforming Applications and Implementations             
+A33 Automatic Data Attributes                          
+A34 Routine Directive with a Name                        
+"""
+
+# Feature names used for test generation, and the TOC heading that specifies each one.
+MAPPING = {
+    "parallel construct": "251 Parallel Construct",
+    "serial construct": "252 Serial Construct",
+    "kernels construct": "253 Kernels Construct",
+    "compute construct if clause": "256 if clause",
+    "compute construct self clause": "257 self clause",
+    "compute construct async clause": "258 async clause",
+    "compute construct wait clause": "259 wait clause",
+    "compute construct num_gangs clause": "2510 num gangs clause",
+    "compute construct num_workersclause": "2511 num workers clause",
+    "compute construct vector_length clause": "2512 vector length clause",
+    "compute construct private clause": "2513 private clause",
+    "compute construct firstprivate clause": "2514 ﬁrstprivate clause",
+    "compute construct reduction clause": "2515 reduction clause",
+    "compute construct default clause": "2516 default clause",
+    "variable predetermined data attributes": "261 Variables with Predetermined Data Attributes",
+    "variable implicit data attributes": "262 Variables with Implicitly Determined Data Attributes",
+    "data construct": "265 Data Construct",
+    "reference counters": "267 Reference Counters",
+    "attachment counter": "268 Attachment Counter",
+    "data deviceptr clause": "274 deviceptr clause",
+    "data present clause": "275 present clause",
+    "data construct copy clause": "276 copy clause",
+    "data construct copyin clause": "277 copyin clause",
+    "data construct copyout clause": "278 copyout clause",
+    "data construct create clause": "279 create clause",
+    "data construct no_create clause": "2710 no create clause",
+    "data construct delete clause": "2711 delete clause",
+    "data construct attach clause": "2712 attach clause",
+    "data construct detach clause": "2713 detach clause",
+    "host_data construct use_device clause": "281 use device clause",
+    "host_data construct if clause": "282 if clause",
+    "host_data construct if_present clause": "283 if present clause",
+    "loop construct collapse clause": "291 collapse clause",
+    "loop construct gang clause": "292 gang clause",
+    "loop construct worker clause": "293 worker clause",
+    "loop construct vector clause": "294 vector clause",
+    "loop construct seq clause": "295 seq clause",
+    "loop construct independent clause": "296 independent clause",
+    "loop construct auto clause": "297 auto clause",
+    "loop construct tile clause": "298 tile clause",
+    "loop construct device_type clause": "299 device type clause",
+    "loop construct private clause": "2910 private clause",
+    "loop construct reduction clause": "2911 reduction clause",
+    "cache directive": "210 Cache Directive",
+    "combined constucts": "211 Combined Constructs",
+    "atomic construct": "212 Atomic Construct",
+    "declare directive": "213 Declare Directive",
+    "declare directive device_resident clause": "2131 device resident clause",
+    "declare directive create clause": "2132 create clause",
+    "declare directive link clause": "2133 link clause",
+    "init directive": "2141 Init Directive",
+    "shutdown directive": "2142 Shutdown Directive",
+    "set directive": "2143 Set Directive",
+    "update directive": "2144 Update Directive",
+    "wait directive": "2145 Wait Directive",
+    "enter data directive": "2146 Enter Data Directive",
+    "exit data directive": "2147 Exit Data Directive",
+    "routine directive": "2151 Routine Directive",
+    "async clause": "2161 async clause",
+    "wait clause": "2162 wait clause",
+    "wait directive": "2163 Wait Directive",
+    "acc get num devices": "321 acc getnum devices",
+    "acc set device type": "322 acc setdevice type",
+    "acc get device type": "323 acc getdevice type",
+    "acc set device num": "324 acc setdevice num",
+    "acc get device num": "325 acc getdevice num",
+    "acc get property": "326 acc getproperty",
+    "acc init": "327 acc init",
+    "acc shutdown": "328 acc shutdown",
+    "acc async test": "329 acc async test",
+    "acc wait": "3210 acc wait",
+    "acc wait async": "3211 acc wait async",
+    "acc wait any": "3212 acc wait any",
+    "acc get default async": "3213 acc getdefault async",
+    "acc set default async": "3214 acc setdefault async",
+    "acc on device": "3215 acc ondevice",
+    "acc malloc": "3216 acc malloc",
+    "acc free": "3217 acc free",
+    "acc copyin and acc create": "3218 acc copyin and acc create",
+    "acc copyout and acc delete": "3219 acc copyout and acc delete",
+    "acc update device and acc update self": "3220 acc update device and acc update self",
+    "acc map data": "3221 acc map data",
+    "acc unmap data": "3222 acc unmap data",
+    "acc deviceptr": "3223 acc deviceptr",
+    "acc hostptr": "3224 acc hostptr",
+    "acc is present": "3225 acc ispresent",
+    "acc memcpy to device": "3226 acc memcpy todevice",
+    "acc memcpy from device": "3227 acc memcpy from device",
+    "acc memcpy device": "3228 acc memcpy device",
+    "acc attach and acc detach": "3229 acc attach and acc detach",
+    "acc memcpy d2d": "3230 acc memcpy d2d"
+}
+
+
+def heading_key(number, title):
+    """Key that matches a TOC entry ("251 Parallel Construct") to its heading in the
+    spec text ("2.5.1 Parallel Construct"), ignoring dots, case, spacing and ligatures."""
+    title = re.sub(r'[^a-z0-9]', '', fix_ligatures(title).lower())
+    return number.replace('.', '') + '|' + title
+
+
+def parse_toc(toc=TOC):
+    """Map heading_key -> TOC heading for every entry in the table of contents."""
+    index = {}
+    for number, title in re.findall(r'([A-Z]?\d+(?:\.\d+)*)(?:\s+)([^\n]+)', toc):
+        index.setdefault(heading_key(number, title), f"{number} {title.strip()}")
+    return index
+
+
+HEADING_PATTERNS = [
+    re.compile(r'^\d+\s+([A-Z]?\d+(?:\.\d+)*)\.?\s+(.+)$'),  # "1003 2.5.1 Parallel Construct" (PDF line number first)
+    re.compile(r'^([A-Z]?\d+(?:\.\d+)*)\.?\s+(.+)$'),  # "2.5.1 Parallel Construct"
+]
+
+
+def match_heading(line, toc_index):
+    line = line.strip()
+    for pattern in HEADING_PATTERNS:
+        match = pattern.match(line)
+        if match:
+            key = heading_key(*match.groups())
+            if key in toc_index:
+                return key, f"{match.group(1)} {match.group(2).strip()}"
+    return None
+
+
+def scan_sections(file_path, toc_index):
+    """One streaming pass over the spec. Returns key -> section with the byte range
+    [start, end) it occupies in the file, from its heading to the next TOC heading."""
+    sections = {}
+    current = None
+    offset = 0
+
+    with open(file_path, 'rb') as file:
+        for raw_line in file:
+            heading = match_heading(raw_line.decode('utf-8', errors='replace'), toc_index)
+            if heading:
+                if current:
+                    current["end"] = offset
+                key, title = heading
+                current = {"heading": toc_index[key], "title": title, "start": offset, "end": None}
+                sections[key] = current
+            offset += len(raw_line)
+
+    if current:
+        current["end"] = offset
+    return sections
+
+
+class SpecText:
+    """Memory-mapped spec file; section text is decoded only when asked for."""
+
+    def __init__(self, file_path):
+        self.file = open(file_path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def text(self, section):
+        return self.data[section["start"]:section["end"]].decode('utf-8', errors='replace').strip()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def split_by_toc(file_path, toc=TOC):
+    """Split the spec into sections, each running from its TOC heading to the next one."""
+    sections = scan_sections(file_path, parse_toc(toc))
+    with SpecText(file_path) as spec:
+        for section in sections.values():
+            section["text"] = spec.text(section)
+    return sections
+
+
+def feature_keys(mapping=MAPPING):
+    keys = {}
+    for feature, heading in mapping.items():
+        number, _, title = heading.partition(" ")
+        keys[feature] = heading_key(number, title)
+    return keys
+
+
+def build_section_index(spec_path, out_path=SECTIONS_FILE, toc=TOC, mapping=MAPPING):
+    clean_path, _ = normalize_spec_file(spec_path)
+    index = {
+        "spec_sha256": hash_file(spec_path),
+        "normalizer": NORMALIZER_VERSION,
+        "sections": split_by_toc(clean_path, toc),
+        "features": feature_keys(mapping),
+    }
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as file:
+        json.dump(index, file)
+    return index
+
+
+def load_section_index(spec_path, path=SECTIONS_FILE):
+    """Load the prebuilt section index, rebuilding it if the spec changed. No embeddings involved."""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            index = json.load(file)
+        if index.get("spec_sha256") == hash_file(spec_path) and index.get("normalizer") == NORMALIZER_VERSION:
+            return index
+    return build_section_index(spec_path, path)
+
+
+def normalize_query(text):
+    text = fix_ligatures(text).lower().replace("_", " ")
+    return " ".join(re.sub(r'[^a-z0-9 ]', ' ', text).split())
+
+
+class SectionRetriever:
+    """Resolve a feature name to its spec section with a dict lookup (or a fuzzy match
+    over the known names). Returns None for free-form queries, which should fall back
+    to vector search."""
+
+    def __init__(self, index, cutoff=FUZZY_CUTOFF):
+        self.sections = index["sections"]
+        self.cutoff = cutoff
+        self.names = {}
+        for feature, key in index["features"].items():
+            if key in self.sections:
+                self.names[normalize_query(feature)] = key
+
+        # Section titles work too, as long as they are unambiguous ("if clause" is not).
+        titles = {}
+        for key, section in self.sections.items():
+            title = normalize_query(section["title"].partition(" ")[2])
+            titles.setdefault(title, []).append(key)
+        for title, keys in titles.items():
+            if len(keys) == 1:
+                self.names.setdefault(title, keys[0])
+
+    def lookup(self, query):
+        name = normalize_query(query)
+        key = self.names.get(name)
+        if key is None:
+            close = difflib.get_close_matches(name, self.names, n=1, cutoff=self.cutoff)
+            if not close:
+                return None
+            key = self.names[close[0]]
+        return self.sections[key]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prebuild the spec section index used for feature lookups.")
+    parser.add_argument("--spec", default="spec.txt")
+    parser.add_argument("--out", default=SECTIONS_FILE)
+    args = parser.parse_args()
+
+    index = build_section_index(args.spec, args.out)
+    mapped = sum(key in index["sections"] for key in index["features"].values())
+    print(f"{len(index['sections'])} sections, {mapped}/{len(index['features'])} features mapped -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
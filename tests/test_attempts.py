@@ -0,0 +1,33 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main as app
+from sandbox import LAUNCH_ERROR, SandboxPool, set_default_pool
+from test_precheck import PARALLEL_TEST
+
+
+def test_missing_compiler_is_a_compile_failure():
+    previous = set_default_pool(SandboxPool(max_workers=1, compiler="llm4vv-no-such-cc"))
+    try:
+        attempt = app.make_attempt(PARALLEL_TEST, "parallel construct")
+    finally:
+        set_default_pool(previous).shutdown()
+    assert attempt["status"] == LAUNCH_ERROR
+    assert "llm4vv-no-such-cc" in attempt["feedback"]
+    assert "Compilation failed" in attempt["feedback"] and "compiled and exited" not in attempt["feedback"]
+    assert not app.should_judge(attempt, final=False, policy="skip_compile_failures")
+    assert not app.should_run_matrix(attempt, final=True)
+
+
+def test_policies_are_read_when_called(monkeypatch):
+    attempt = {"status": "failed", "exit_code": 1}
+    monkeypatch.setattr(app, "JUDGE_POLICY", "final")
+    monkeypatch.setattr(app, "MATRIX_POLICY", "all")
+    assert not app.should_judge(attempt, final=False)
+    assert app.should_run_matrix(attempt, final=False)
+    monkeypatch.setattr(app, "MATRIX_POLICY", "off")
+    assert not app.should_run_matrix(attempt, final=True)
+    assert app.should_judge(attempt, final=False, policy="all")
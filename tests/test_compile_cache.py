@@ -0,0 +1,42 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from compile_cache import RESULT_FILE, CompileCache
+
+FIELDS = {"status": "passed", "exit_code": 0, "compile_output": "x" * 200, "run_output": ""}
+
+
+def put(cache, key, mtime):
+    cache.put(key, FIELDS)
+    os.utime(os.path.join(cache.entry_dir(key), RESULT_FILE), (mtime, mtime))
+
+
+def test_put_keeps_a_running_total_without_scanning(tmp_path, monkeypatch):
+    cache = CompileCache(str(tmp_path))
+    monkeypatch.setattr(cache, "entries", lambda: (_ for _ in ()).throw(AssertionError("scanned")))
+    cache.put("aa01", FIELDS)
+    cache.put("aa02", FIELDS)
+    assert cache.total_bytes == 2 * os.path.getsize(os.path.join(cache.entry_dir("aa01"), RESULT_FILE))
+    assert CompileCache(str(tmp_path)).total_bytes == cache.total_bytes
+
+
+def test_least_recently_used_entries_are_evicted_past_the_limit(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    put(cache, "aa01", 1000)
+    entry = cache.total_bytes
+    cache.max_bytes = 2 * entry
+    put(cache, "aa02", 3000)
+    cache.get("aa01")  # used again, so now the newest
+    put(cache, "aa03", 4000)
+    assert cache.get("aa02") is None
+    assert cache.get("aa01") is not None and cache.get("aa03") is not None
+    assert cache.total_bytes == 2 * entry
+
+
+def test_uncacheable_results_are_not_stored(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    cache.put("aa01", dict(FIELDS, status="compile_timeout"))
+    assert cache.get("aa01") is None and cache.total_bytes == 0
@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from jobs import PRIORITIES, JobQueue
+
+
+def item(feature):
+    return {"feature": feature, "prompt": feature, "context": None}
+
+
+def test_interactive_jobs_are_claimed_first(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    bulk = queue.submit([item("a"), item("b")], "bulk")
+    interactive = queue.submit([item("c")], "interactive")
+    assert queue.claim(max_priority=PRIORITIES["interactive"])["id"] == interactive[0]
+    assert queue.claim(max_priority=PRIORITIES["interactive"]) is None
+    assert [queue.claim()["id"], queue.claim()["id"]] == bulk
+    assert queue.claim() is None
+
+
+def test_resubmitting_an_active_job_reuses_it(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    ids = queue.submit([item("a")], "bulk")
+    assert queue.submit([item("a")], "interactive") == ids
+    assert queue.get(ids[0])["priority"] == PRIORITIES["interactive"]
+    assert queue.submit([item("a")], "bulk", force=True) != ids
+
+
+def test_each_job_is_claimed_once(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    JobQueue(path).submit([item(str(i)) for i in range(100)])
+    claimed = []
+
+    def worker(owner):
+        queue = JobQueue(path)  # its own connection, like another server
+        while True:
+            job = queue.claim(owner=owner)
+            if job is None:
+                return
+            claimed.append(job["id"])
+
+    threads = [threading.Thread(target=worker, args=(f"server-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(set(claimed)) and len(claimed) == 100
+
+
+def test_only_own_or_stale_jobs_are_requeued(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    queue.submit([item("a"), item("b")])
+    mine = queue.claim(owner="me")
+    theirs = queue.claim(owner="them")
+    assert queue.requeue_running() == 0  # both heartbeats are fresh
+    assert queue.requeue_running("me") == 1
+    assert queue.get(mine["id"])["status"] == "queued" and queue.get(theirs["id"])["status"] == "running"
+    assert queue.requeue_running(stale_seconds=-1) == 1
+    assert queue.get(theirs["id"])["status"] == "queued"
+
+
+def test_attempts_are_added_and_updated_in_place(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"))
+    job_id = queue.submit([item("a")])[0]
+    queue.claim()
+    queue.add_attempt(job_id, {"status": "failed", "evaluation": None})
+    queue.add_attempt(job_id, {"status": "passed", "evaluation": None})
+    queue.update_attempt(job_id, 0, {"status": "failed", "evaluation": "Not a valid test."})
+    assert queue.get(job_id)["attempts"] == [{"status": "failed", "evaluation": "Not a valid test."},
+                                             {"status": "passed", "evaluation": None}]
+    assert not queue.cancel_queued(job_id)
@@ -0,0 +1,81 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from batch import load_features, precheck_feature
+from compile_cache import CompileCache
+from precheck import REJECTED, precheck, static_problems
+from sandbox import SandboxPool
+
+PARALLEL_TEST = """#include <stdlib.h>
+
+int main() {
+    int n = 1024, errors = 0;
+    float *a = (float *) malloc(n * sizeof(float));
+    #pragma acc parallel copyout(a[0:n])
+    {
+        #pragma acc loop
+        for (int i = 0; i < n; ++i) {
+            a[i] = 2.0f * i;
+        }
+    }
+    for (int i = 0; i < n; ++i) {
+        if (a[i] != 2.0f * i) {
+            errors++;
+        }
+    }
+    free(a);
+    return errors != 0;
+}
+"""
+
+
+def sample_item(idx):
+    items = load_features(os.path.join(ROOT, "dev", "sample_prompts.jl"))
+    return next(item for item in items if item["feature"] == f"idx {idx}")
+
+
+def test_jl_instruction_is_not_matched_as_a_feature():
+    item = sample_item(1)
+    assert "parallel construct" in item["prompt"]
+    assert precheck_feature(item) is None
+    assert static_problems(PARALLEL_TEST, precheck_feature(item)) == []
+
+
+def test_jl_instruction_would_over_constrain_the_test():
+    # Why .jl items skip matching: the instruction's spec text names unrelated clauses and routines.
+    assert static_problems(PARALLEL_TEST, sample_item(1)["prompt"]) != []
+
+
+def test_feature_name_is_matched():
+    item = {"feature": "parallel construct", "prompt": "parallel construct", "context": None}
+    assert static_problems(PARALLEL_TEST, precheck_feature(item)) == []
+    problems = static_problems(PARALLEL_TEST, "kernels construct")
+    assert len(problems) == 1 and "kernels" in problems[0]
+
+
+def test_trivial_failures_are_rejected_without_compiling():
+    assert "No code block" in static_problems("")[0]
+    assert "main()" in static_problems(PARALLEL_TEST.replace("main", "test"))[0]
+    assert "no OpenACC" in static_problems("int main() { return 0; }\n")[0]
+    result = precheck("", syntax=False)
+    assert result.status == REJECTED and result.exit_code != 0
+
+
+@pytest.mark.skipif(shutil.which("gcc") is None, reason="needs gcc")
+def test_cache_lookup_is_not_counted(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    pool = SandboxPool(max_workers=1, cache=cache, compiler="gcc", flags=["-fopenacc"])
+    try:
+        assert precheck(PARALLEL_TEST, pool=pool) is None
+        pool.submit(PARALLEL_TEST).result()
+        assert precheck(PARALLEL_TEST, pool=pool) is None
+        pool.submit(PARALLEL_TEST).result()
+    finally:
+        pool.shutdown()
+    assert cache.stats() == {"hits": 1, "misses": 1}
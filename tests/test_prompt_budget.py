@@ -0,0 +1,52 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from prompt_budget import TRIM_MARKER, Section, approximate_tokens, assemble, get_token_counter
+
+INSTRUCTION = "Write a test for the OpenACC parallel construct in C.\n\n"
+QUESTION = "Reply with the complete test program."
+
+
+def test_instruction_survives_trimming():
+    sections = [
+        Section("instruction", INSTRUCTION, required=True),
+        Section("context", "The parallel construct launches gangs. " * 200, header="Context:\n", priority=0),
+        Section("question", QUESTION, required=True),
+    ]
+    prompt, report = assemble(sections, 120, approximate_tokens)
+    assert prompt.startswith(INSTRUCTION) and prompt.endswith(QUESTION)
+    assert TRIM_MARKER in prompt
+    assert approximate_tokens(prompt) <= 120
+    assert report["context"][0] < report["context"][1]
+
+
+def test_missing_tokenizer_falls_back_to_conservative_count():
+    counter = get_token_counter(os.path.join(ROOT, "no-such-tokenizer"))
+    assert counter is approximate_tokens
+    # At least one token per 3 characters, so a budget in these units isn't overrun by BPE.
+    assert counter("#pragma acc parallel loop") == 9
+
+
+def test_lowest_priority_is_trimmed_first():
+    sections = [
+        Section("instruction", INSTRUCTION, required=True),
+        Section("context", "spec text " * 50, header="Context:\n", footer="\n", priority=0),
+        Section("code", "int x = 0;\n" * 20, header="Code:\n", footer="\n", priority=3),
+        Section("runtime", "line\n" * 100, header="Runtime:\n", footer="\n", priority=1, keep="tail"),
+    ]
+    full = approximate_tokens("".join(section.header + section.text + section.footer for section in sections))
+    prompt, report = assemble(sections, full - 300, approximate_tokens)
+    assert report["context"][0] == 0 and "Context:" not in prompt  # dropped, header and all
+    assert report["code"][0] == report["code"][1]
+    assert 0 < report["runtime"][0] < report["runtime"][1]
+    assert "Runtime:\n" + TRIM_MARKER in prompt and prompt.endswith("line\nline\n\n")  # the tail is kept
+
+
+def test_section_budget_applies_before_the_total():
+    sections = [Section("code", "x" * 300, header="Code:\n", budget=20, keep="head")]
+    prompt, report = assemble(sections, 1000, approximate_tokens)
+    assert report["code"] == [approximate_tokens(prompt), approximate_tokens("Code:\n" + "x" * 300)]
+    assert report["code"][0] <= 20 and prompt.startswith("Code:\nxxx") and prompt.endswith(TRIM_MARKER)
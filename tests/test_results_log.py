@@ -0,0 +1,33 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "dev"))
+
+from results_log import ResultsLog, in_shard, shard_path
+
+
+def test_resume_after_a_torn_write(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    with ResultsLog(path) as log:
+        log.append({"idx": 1, "retry": 0, "final": False})
+        log.append({"idx": 1, "retry": 1, "final": True})
+        log.append({"idx": 2, "retry": 0, "final": False})
+        log.append({"idx": 2, "retry": 1, "final": False})
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write('{"idx": 2, "retry": 2, "fi')  # crashed mid-write
+
+    with ResultsLog(path) as log:
+        assert log.finished() == {1}
+        assert {idx: record["retry"] for idx, record in log.last_attempts().items()} == {2: 1}
+        log.append({"idx": 2, "retry": 2, "final": True})
+    with ResultsLog(path) as log:
+        assert log.finished() == {1, 2} and log.last_attempts() == {}
+
+
+def test_shards_split_prompts_without_overlap():
+    keys = list(range(20)) + ["a", "b", "c"]
+    shards = [[key for key in keys if in_shard(key, shard, 3)] for shard in range(3)]
+    assert sorted(map(str, sum(shards, []))) == sorted(map(str, keys))
+    assert shard_path("results.jsonl", 1, 3) == "results.shard-1-of-3.jsonl"
+    assert shard_path("results.jsonl", 0, 1) == "results.jsonl"
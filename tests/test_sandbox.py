@@ -0,0 +1,82 @@
+import os
+import shutil
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from compile_cache import CompileCache
+from sandbox import LAUNCH_ERROR, TIMEOUT_EXIT_CODE, SandboxPool, compile_and_run, run_limited
+
+needs_gcc = pytest.mark.skipif(shutil.which("gcc") is None, reason="needs gcc")
+
+PASSING = "int main(void) { return 0; }\n"
+FAILING = "#include <stdio.h>\nint main(void) { printf(\"wrong\\n\"); return 2; }\n"
+BROKEN = "int main(void) { return undefined_name; }\n"
+HANGING = "int main(void) { for (;;) {} }\n"
+
+
+def alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as file:
+            return file.read().split(")")[-1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@needs_gcc
+def test_statuses():
+    assert compile_and_run(PASSING, compiler="gcc", flags=[]).status == "passed"
+    failed = compile_and_run(FAILING, compiler="gcc", flags=[])
+    assert (failed.status, failed.exit_code, failed.run_output) == ("failed", 2, "wrong")
+    broken = compile_and_run(BROKEN, compiler="gcc", flags=[])
+    assert broken.status == "compile_error" and "undefined_name" in broken.compile_output
+
+
+@needs_gcc
+def test_run_timeout():
+    result = compile_and_run(HANGING, compiler="gcc", flags=[], run_timeout=0.5)
+    assert result.status == "run_timeout" and result.exit_code == TIMEOUT_EXIT_CODE
+    assert result.run_seconds < 5
+
+
+def test_timeout_kills_the_whole_process_group(tmp_path):
+    start = time.monotonic()
+    _, _, _, timed_out, _ = run_limited(["sh", "-c", "sleep 60 & echo $! > child; wait"], str(tmp_path), 0.5)
+    assert timed_out and time.monotonic() - start < 5
+    child = int((tmp_path / "child").read_text())
+    deadline = time.monotonic() + 2
+    while alive(child) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not alive(child)
+
+
+def test_memory_limit(tmp_path):
+    command = [sys.executable, "-c", "x = bytearray(1024 * 1024 * 1024)"]
+    returncode, _, stderr, _, _ = run_limited(command, str(tmp_path), 30, memory_mb=256)
+    assert returncode != 0 and "MemoryError" in stderr
+    assert run_limited(command, str(tmp_path), 30)[0] == 0
+
+
+@pytest.mark.parametrize("memory_mb", [None, 256])
+def test_missing_command_is_an_os_error(tmp_path, memory_mb):
+    with pytest.raises(OSError) as error:
+        run_limited(["llm4vv-no-such-cc", "test.c"], str(tmp_path), 5, memory_mb)
+    assert error.value.filename == "llm4vv-no-such-cc"
+    result = compile_and_run(PASSING, compiler="llm4vv-no-such-cc", flags=[], compile_memory_mb=memory_mb)
+    assert result.status == LAUNCH_ERROR and "llm4vv-no-such-cc" in result.compile_output
+
+
+@needs_gcc
+def test_pool_answers_a_repeated_build_from_the_cache(tmp_path):
+    pool = SandboxPool(max_workers=2, cache=CompileCache(str(tmp_path)), compiler="gcc", flags=[])
+    try:
+        first = pool.run(FAILING)
+        again = pool.run(FAILING + "\n\n")  # trailing blank lines can't change the build
+    finally:
+        pool.shutdown()
+    assert not first.cached and again.cached
+    assert (again.status, again.exit_code, again.run_output) == (first.status, first.exit_code, first.run_output)
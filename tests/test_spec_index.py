@@ -0,0 +1,67 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexical import BM25Index
+from spec_index import Shard, SpecRetriever, add_embeddings, build_shard
+
+PARAGRAPHS = [
+    "The parallel construct launches gangs that execute the region in parallel.",
+    "The kernels construct lets the compiler decide how to parallelize loops.",
+    "The num_gangs clause sets the number of gangs for a parallel construct.",
+    "The copyin clause copies data to the device at region entry.",
+]
+
+
+class WordEmbeddings:
+    """Counts of a few words: enough for the vector ranking to prefer the right chunk."""
+    WORDS = ["parallel", "kernels", "gangs", "copyin", "device", "loops"]
+
+    def vector(self, text):
+        words = text.lower().replace(".", " ").split()
+        return [float(words.count(word)) for word in self.WORDS]
+
+    def embed_documents(self, texts):
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.vector(text)
+
+
+def make_shard(tmp_path):
+    spec = tmp_path / "tiny-spec.txt"
+    spec.write_text("\n\n".join(PARAGRAPHS) + "\n", encoding='utf-8')
+    return str(spec), build_shard(str(spec), str(tmp_path / "index"), chunk_size=100, chunk_overlap=0)
+
+
+def test_bm25_ranks_the_matching_chunk_first():
+    index = BM25Index.from_dict(BM25Index.build(PARAGRAPHS).to_dict())
+    assert index.search("num gangs clause", 1)[0][0] == 2
+    assert index.search("copyin", 4) == index.search("COPYIN", 4)
+    assert index.search("unrelated words", 3) == []
+
+
+def test_shard_is_built_once_and_reopened_from_disk(tmp_path):
+    spec, path = make_shard(tmp_path)
+    assert path.startswith(str(tmp_path / "index" / "shards" / "tiny-spec"))
+    assert build_shard(spec, str(tmp_path / "index"), chunk_size=100, chunk_overlap=0) == path
+    shard = Shard(path)
+    assert [shard[i] for i in range(len(shard))] == PARAGRAPHS
+    assert [Shard(path)[i] for i in range(len(shard))] == PARAGRAPHS
+    assert os.path.exists(tmp_path / "index" / "tiny-spec.clean.txt")
+
+
+def test_lexical_vector_and_hybrid_retrieval(tmp_path):
+    _, path = make_shard(tmp_path)
+    shard = Shard(path)
+    embeddings = WordEmbeddings()
+    add_embeddings(shard, embeddings, "words")
+    shard = Shard(path)  # the embedding matrix is read back through its memory map
+    search = {mode: SpecRetriever(shard, mode, embeddings, "words").similarity_search for mode in
+              ("lexical", "vector", "hybrid")}
+    assert search["lexical"]("copyin clause", 1)[0].page_content == PARAGRAPHS[3]
+    assert search["vector"]("kernels loops", 1)[0].page_content == PARAGRAPHS[1]
+    hybrid = search["hybrid"]("num_gangs for parallel gangs", 2)
+    assert hybrid[0].page_content == PARAGRAPHS[2] and len(hybrid) == 2
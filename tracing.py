@@ -0,0 +1,219 @@
+import contextvars
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency histogram buckets exported to Prometheus.
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_KINDS = ("prompt_tokens", "completion_tokens")
+
+# Spans opened while a collector is active are also appended to it, with its attributes.
+_collector = contextvars.ContextVar("trace_collector", default=None)
+
+
+class Span:
+    """One timed stage. Attributes are free-form; prompt_tokens, completion_tokens and
+    cache_hit also feed the exported counters."""
+    recording = True
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.start = None
+        self.seconds = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def elapsed(self):
+        return time.perf_counter() - self._clock
+
+    def __enter__(self):
+        self.start = time.time()
+        self._clock = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._clock
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer.finish(self)
+
+    def to_dict(self):
+        return {"stage": self.name, "start": self.start, "seconds": self.seconds, **self.attributes}
+
+
+class NoopSpan:
+    """What span() hands out while tracing is off: no clock reads, no locking, no storage."""
+    recording = False
+
+    def set(self, **attributes):
+        pass
+
+    def elapsed(self):
+        return 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Collector:
+    def __init__(self, spans, attributes):
+        self.spans = spans
+        self.attributes = attributes
+        self.token = None
+
+    def __enter__(self):
+        parent = _collector.get()
+        if parent is not None:
+            self.attributes = {**parent.attributes, **self.attributes}
+            if self.spans is None:
+                self.spans = parent.spans
+        if self.spans is None:
+            self.spans = []
+        self.token = _collector.set(self)
+        return self.spans
+
+    def __exit__(self, *exc):
+        _collector.reset(self.token)
+
+
+class Tracer:
+    """Times pipeline stages and keeps per-stage aggregates for the metrics endpoint.
+
+    Finished spans go to the active collector (a run's "Timings" list) and, if trace_file
+    is set, are appended to it as JSON lines.
+    """
+
+    def __init__(self, enabled=True, trace_file=None):
+        self.enabled = enabled
+        self.trace_file = trace_file
+        self.lock = threading.Lock()
+        self.buckets = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+        self.seconds = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.tokens = defaultdict(int)
+        self.cache_hits = defaultdict(int)
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def record(self, name, seconds, **attributes):
+        """A span for a stage that was timed elsewhere (e.g. by the sandbox)."""
+        if not self.enabled:
+            return
+        span = Span(self, name, attributes)
+        span.start = time.time() - seconds
+        span.seconds = seconds
+        self.finish(span)
+
+    def collect(self, spans=None, **attributes):
+        """Context manager: spans finished inside it (in this thread or task) are appended to spans,
+        or to the enclosing collector's list if spans is None."""
+        return Collector(spans, attributes)
+
+    def finish(self, span):
+        collector = _collector.get()
+        if collector is not None:
+            for key, value in collector.attributes.items():
+                span.attributes.setdefault(key, value)
+            collector.spans.append(span.to_dict())
+
+        bucket = next((i for i, bound in enumerate(BUCKETS) if span.seconds <= bound), len(BUCKETS))
+        with self.lock:
+            self.buckets[span.name][bucket] += 1
+            self.seconds[span.name] += span.seconds
+            self.counts[span.name] += 1
+            for kind in TOKEN_KINDS:
+                if span.attributes.get(kind):
+                    self.tokens[span.name, kind] += span.attributes[kind]
+            if span.attributes.get("cache_hit"):
+                self.cache_hits[span.name] += 1
+            if self.trace_file:
+                with open(self.trace_file, 'a', encoding='utf-8') as file:
+                    file.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def prometheus_text(self):
+        """Aggregates in the Prometheus text exposition format."""
+        lines = ["# HELP llm4vv_stage_seconds Wall time of each pipeline stage.",
+                 "# TYPE llm4vv_stage_seconds histogram"]
+        with self.lock:
+            for stage in sorted(self.counts):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), self.buckets[stage]):
+                    cumulative += count
+                    lines.append(f'llm4vv_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'llm4vv_stage_seconds_sum{{stage="{stage}"}} {self.seconds[stage]:.6f}')
+                lines.append(f'llm4vv_stage_seconds_count{{stage="{stage}"}} {self.counts[stage]}')
+            lines += ["# HELP llm4vv_tokens_total Prompt and completion tokens per stage.",
+                      "# TYPE llm4vv_tokens_total counter"]
+            for (stage, kind), count in sorted(self.tokens.items()):
+                lines.append(f'llm4vv_tokens_total{{stage="{stage}",kind="{kind.split("_")[0]}"}} {count}')
+            lines += ["# HELP llm4vv_cache_hits_total Stages answered from a cache.",
+                      "# TYPE llm4vv_cache_hits_total counter"]
+            for stage, count in sorted(self.cache_hits.items()):
+                lines.append(f'llm4vv_cache_hits_total{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def record_sandbox(result, tracer=None):
+    """Compile and execute spans for a SandboxResult; the sandbox timed both itself.
+    A cached result did neither, so it is recorded as a zero-time cache hit."""
+    tracer = tracer or _default_tracer
+    tracer.record("compile", 0.0 if result.cached else result.compile_seconds,
+                  cache_hit=result.cached, status=result.status)
+    if result.status not in ("compile_error", "compile_timeout", "launch_error", "error"):
+        tracer.record("execute", 0.0 if result.cached else result.run_seconds,
+                      cache_hit=result.cached, exit_code=result.exit_code)
+
+
+def spans_to_jsonl(spans):
+    return "".join(json.dumps(span, default=str) + "\n" for span in spans)
+
+
+def serve_metrics(tracer, port, host="0.0.0.0"):
+    """Serve tracer.prometheus_text() at http://host:port/metrics from a daemon thread."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
+
+
+_default_tracer = Tracer()
+
+
+def get_tracer():
+    return _default_tracer
+
+
+def configure(enabled=True, trace_file=None):
+    """Settings for the process-wide tracer returned by get_tracer()."""
+    _default_tracer.enabled = enabled
+    _default_tracer.trace_file = trace_file
+    return _default_tracer